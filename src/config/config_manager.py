@@ -6,12 +6,28 @@
 import yaml
 import threading
 import os
-from typing import Dict, List, Any, Optional, Set
-from dataclasses import dataclass, asdict
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Set
+from dataclasses import dataclass
 import logging
 from datetime import datetime
 
-@dataclass
+try:
+    # 优先使用 libyaml 的 C 实现，解析/序列化速度快很多
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+
+# 默认信号权重
+DEFAULT_SIGNAL_WEIGHTS = {
+    'ema_cross': 0.3,
+    'macd_cross': 0.2,
+    'adx_strength': 0.2,
+    'bb_position': 0.15,
+    'rsi_level': 0.15
+}
+
+@dataclass(slots=True)
 class TrendAnalysisConfig:
     """趋势分析配置"""
     # 趋势判断阈值
@@ -41,15 +57,9 @@ class TrendAnalysisConfig:
     
     def __post_init__(self):
         if self.signal_weights is None:
-            self.signal_weights = {
-                'ema_cross': 0.3,
-                'macd_cross': 0.2,
-                'adx_strength': 0.2,
-                'bb_position': 0.15,
-                'rsi_level': 0.15
-            }
+            self.signal_weights = dict(DEFAULT_SIGNAL_WEIGHTS)
 
-@dataclass
+@dataclass(slots=True)
 class UserFluctuationConfig:
     """用户波动监控配置"""
     threshold_percent: float = 3.0  # 波动阈值百分比
@@ -61,7 +71,7 @@ class UserFluctuationConfig:
         if self.symbols is None:
             self.symbols = ["AAPL", "TSLA", "NVDA", "MSFT", "GOOGL"]
 
-@dataclass
+@dataclass(slots=True)
 class UserTrendConfig:
     """用户趋势监控配置"""
     enabled: bool = True  # 是否启用趋势监控
@@ -75,7 +85,7 @@ class UserTrendConfig:
         if self.symbols is None:
             self.symbols = ["AAPL", "TSLA", "NVDA", "MSFT", "GOOGL"]
 
-@dataclass 
+@dataclass(slots=True)
 class UserConfig:
     """单个用户配置"""
     email: str  # 用户邮箱（唯一标识）
@@ -90,11 +100,15 @@ class UserConfig:
             self.fluctuation = UserFluctuationConfig()
         if self.trend is None:
             self.trend = UserTrendConfig()
-        if not self.created_at:
-            self.created_at = datetime.now().isoformat()
-        self.updated_at = datetime.now().isoformat()
+        if not self.created_at or not self.updated_at:
+            now = datetime.now().isoformat()
+            if not self.created_at:
+                self.created_at = now
+            # 仅在未提供时填充，避免从文件加载时覆盖原有更新时间
+            if not self.updated_at:
+                self.updated_at = now
 
-@dataclass
+@dataclass(slots=True)
 class SystemConfig:
     """系统配置"""
     # SMTP配置
@@ -111,6 +125,8 @@ class SystemConfig:
     # 系统配置
     log_level: str = "INFO"
     timezone: str = "UTC"
+    trend_max_workers: int = 0  # 所有用户共享的趋势分析线程数，0 表示按 CPU 核数自动选择，修改后重启生效
+    fluctuation_batch_window_seconds: int = 0  # 波动提醒合并窗口（秒），0 表示立即发送
     
     # 全局趋势分析配置
     trend_analysis: TrendAnalysisConfig = None
@@ -147,39 +163,88 @@ class MultiUserConfigManager:
         self.system_config = SystemConfig()
         self._lock = threading.RLock()
         self._callbacks = []  # 配置变更回调函数列表
+        # 用户快照和索引，在用户配置变更时整体重建后替换（写时复制），读取时无需加锁
+        self._users_snapshot = MappingProxyType({})
+        self._fluct_enabled: Dict[str, UserConfig] = {}
+        self._trend_enabled: Dict[str, UserConfig] = {}
+        self._symbol_to_fluct_users: Dict[str, List[UserConfig]] = {}
+        self._symbol_to_trend_users: Dict[str, List[UserConfig]] = {}
+        self._monitored_symbols: Set[str] = set()
+        # 已解析配置文件的 (mtime_ns, size) 签名，文件未变化时跳过重新解析
+        self._users_sig = None
+        self._system_sig = None
         
         # 加载配置
         self.load_all_configs()
     
+    @staticmethod
+    def _file_signature(path: str):
+        """返回文件的 (mtime_ns, size) 签名"""
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    
     def _expand_stock_symbols(self, symbols: List[str]) -> List[str]:
         """展开股票池引用，将股票池名称替换为实际股票列表"""
         if isinstance(symbols, str):
             # 如果是单个字符串（@引用），转换为列表
             symbols = [symbols]
         
+        pools = self.system_config.stock_pools
         expanded = []
         for symbol in symbols:
             if symbol.startswith('@'):
                 # 处理@引用，如 "@china_tech"
                 pool_name = symbol[1:]  # 移除@符号
-                if pool_name in self.system_config.stock_pools:
-                    expanded.extend(self.system_config.stock_pools[pool_name])
+                if pool_name in pools:
+                    expanded.extend(pools[pool_name])
                 else:
                     logging.warning(f"股票池引用不存在: {pool_name}")
-            elif symbol in self.system_config.stock_pools:
+            elif symbol in pools:
                 # 如果是股票池名称，展开为具体股票
-                expanded.extend(self.system_config.stock_pools[symbol])
+                expanded.extend(pools[symbol])
             else:
                 # 否则直接添加
                 expanded.append(symbol)
         # 去重并保持顺序
-        seen = set()
-        result = []
-        for s in expanded:
-            if s not in seen:
-                seen.add(s)
-                result.append(s)
-        return result
+        return list(dict.fromkeys(expanded))
+    
+    def _needs_expansion(self, symbols: List[str]) -> bool:
+        """判断股票列表是否包含股票池引用或重复项，需要经过展开处理"""
+        if isinstance(symbols, str):
+            return True
+        pools = self.system_config.stock_pools
+        return (any(s.startswith('@') or s in pools for s in symbols)
+                or len(set(symbols)) != len(symbols))
+    
+    def _rebuild_indexes(self):
+        """根据当前用户配置重建用户快照和索引（调用方需持有锁）"""
+        fluct_enabled = {}
+        trend_enabled = {}
+        symbol_to_fluct_users: Dict[str, List[UserConfig]] = {}
+        symbol_to_trend_users: Dict[str, List[UserConfig]] = {}
+        monitored_symbols = set()
+        
+        for email, user in self.users.items():
+            if user.fluctuation.enabled:
+                fluct_enabled[email] = user
+                fluct_symbols = frozenset(user.fluctuation.symbols)
+                for symbol in fluct_symbols:
+                    symbol_to_fluct_users.setdefault(symbol, []).append(user)
+                monitored_symbols |= fluct_symbols
+            if user.trend.enabled:
+                trend_enabled[email] = user
+                trend_symbols = frozenset(user.trend.symbols)
+                for symbol in trend_symbols:
+                    symbol_to_trend_users.setdefault(symbol, []).append(user)
+                # 过滤掉特殊标识符
+                monitored_symbols.update(s for s in trend_symbols if not s.startswith('TOP_'))
+        
+        self._users_snapshot = MappingProxyType(dict(self.users))
+        self._fluct_enabled = fluct_enabled
+        self._trend_enabled = trend_enabled
+        self._symbol_to_fluct_users = symbol_to_fluct_users
+        self._symbol_to_trend_users = symbol_to_trend_users
+        self._monitored_symbols = monitored_symbols
     
     def load_all_configs(self):
         """加载所有配置"""
@@ -190,8 +255,14 @@ class MultiUserConfigManager:
         """加载用户配置"""
         try:
             if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f) or {}
+                sig = self._file_signature(self.config_file)
+                if sig == self._users_sig:
+                    return True
+                
+                # 一次性读入字节，由 libyaml 内部完成 UTF-8 解码
+                with open(self.config_file, 'rb') as f:
+                    buf = f.read()
+                data = yaml.load(buf, Loader=_Loader) or {}
                 
                 self.users = {}
                 for email, user_data in data.items():
@@ -213,14 +284,20 @@ class MultiUserConfigManager:
                     # 解析用户自定义趋势分析配置
                     analysis_config = None
                     if 'analysis_config' in trend_data:
-                        ac_data = trend_data['analysis_config']
+                        ac_data = trend_data['analysis_config'] or {}
+                        ac_thresholds = ac_data.get('thresholds') or {}
+                        ac_signal_thresholds = ac_data.get('signal_thresholds') or {}
                         analysis_config = TrendAnalysisConfig(
-                            up_trend_threshold=ac_data.get('thresholds', {}).get('up_trend', 3),
-                            down_trend_threshold=ac_data.get('thresholds', {}).get('down_trend', 3),
+                            up_trend_threshold=ac_thresholds.get('up_trend', 3),
+                            down_trend_threshold=ac_thresholds.get('down_trend', 3),
                             signal_weights=ac_data.get('signal_weights', None),
-                            buy_signal_threshold=ac_data.get('signal_thresholds', {}).get('buy_signal', 0.8),
-                            sell_signal_threshold=ac_data.get('signal_thresholds', {}).get('sell_signal', 0.8)
+                            buy_signal_threshold=ac_signal_thresholds.get('buy_signal', 0.8),
+                            sell_signal_threshold=ac_signal_thresholds.get('sell_signal', 0.8)
                         )
+                        # 与系统默认配置相同时共用系统配置实例，但仍保留为用户的显式配置，
+                        # 保存时照常写回，之后系统配置变化不会影响该用户
+                        if analysis_config == self.system_config.trend_analysis:
+                            analysis_config = self.system_config.trend_analysis
                     
                     trend_config = UserTrendConfig(
                         enabled=trend_data.get('enabled', True),
@@ -231,8 +308,10 @@ class MultiUserConfigManager:
                     )
                     
                     # 展开股票池引用
-                    fluctuation_config.symbols = self._expand_stock_symbols(fluctuation_config.symbols)
-                    trend_config.symbols = self._expand_stock_symbols(trend_config.symbols)
+                    if self._needs_expansion(fluctuation_config.symbols):
+                        fluctuation_config.symbols = self._expand_stock_symbols(fluctuation_config.symbols)
+                    if self._needs_expansion(trend_config.symbols):
+                        trend_config.symbols = self._expand_stock_symbols(trend_config.symbols)
                     
                     self.users[email] = UserConfig(
                         email=email,
@@ -243,7 +322,10 @@ class MultiUserConfigManager:
                         updated_at=user_data.get('profile', {}).get('updated_at', '')
                     )
                 
-                logging.info(f"用户配置加载成功: {len(self.users)} 个用户")
+                with self._lock:
+                    self._rebuild_indexes()
+                self._users_sig = sig
+                logging.debug(f"用户配置加载成功: {len(self.users)} 个用户")
                 return True
             else:
                 logging.info("用户配置文件不存在，创建空配置")
@@ -257,8 +339,14 @@ class MultiUserConfigManager:
         """加载系统配置"""
         try:
             if os.path.exists(self.system_config_file):
-                with open(self.system_config_file, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f) or {}
+                sig = self._file_signature(self.system_config_file)
+                if sig == self._system_sig:
+                    return True
+                
+                # 一次性读入字节，由 libyaml 内部完成 UTF-8 解码
+                with open(self.system_config_file, 'rb') as f:
+                    buf = f.read()
+                data = yaml.load(buf, Loader=_Loader) or {}
                 
                 # 解析SMTP配置
                 smtp_data = data.get('smtp', {})
@@ -270,11 +358,16 @@ class MultiUserConfigManager:
                 system_data = data.get('system', {})
                 
                 # 解析趋势分析配置
-                trend_analysis_data = data.get('trend_analysis', {})
-                thresholds = trend_analysis_data.get('thresholds', {})
-                signal_weights = trend_analysis_data.get('signal_weights', {})
-                signal_thresholds = trend_analysis_data.get('signal_thresholds', {})
-                indicators = trend_analysis_data.get('indicators', {})
+                trend_analysis_data = data.get('trend_analysis') or {}
+                thresholds = trend_analysis_data.get('thresholds') or {}
+                signal_weights = trend_analysis_data.get('signal_weights') or {}
+                signal_thresholds = trend_analysis_data.get('signal_thresholds') or {}
+                indicators = trend_analysis_data.get('indicators') or {}
+                ema = indicators.get('ema') or {}
+                macd = indicators.get('macd') or {}
+                adx = indicators.get('adx') or {}
+                bb = indicators.get('bollinger_bands') or {}
+                rsi = indicators.get('rsi') or {}
                 
                 trend_analysis = TrendAnalysisConfig(
                     up_trend_threshold=thresholds.get('up_trend', 3),
@@ -282,18 +375,18 @@ class MultiUserConfigManager:
                     signal_weights=signal_weights if signal_weights else None,
                     buy_signal_threshold=signal_thresholds.get('buy_signal', 0.8),
                     sell_signal_threshold=signal_thresholds.get('sell_signal', 0.8),
-                    ema_short_period=indicators.get('ema', {}).get('short_period', 7),
-                    ema_long_period=indicators.get('ema', {}).get('long_period', 20),
-                    macd_fast_period=indicators.get('macd', {}).get('fast_period', 12),
-                    macd_slow_period=indicators.get('macd', {}).get('slow_period', 26),
-                    macd_signal_period=indicators.get('macd', {}).get('signal_period', 9),
-                    adx_period=indicators.get('adx', {}).get('period', 14),
-                    adx_threshold=indicators.get('adx', {}).get('threshold', 25.0),
-                    bb_period=indicators.get('bollinger_bands', {}).get('period', 20),
-                    bb_std_dev=indicators.get('bollinger_bands', {}).get('std_dev', 2.0),
-                    rsi_period=indicators.get('rsi', {}).get('period', 14),
-                    rsi_overbought=indicators.get('rsi', {}).get('overbought', 70.0),
-                    rsi_oversold=indicators.get('rsi', {}).get('oversold', 30.0)
+                    ema_short_period=ema.get('short_period', 7),
+                    ema_long_period=ema.get('long_period', 20),
+                    macd_fast_period=macd.get('fast_period', 12),
+                    macd_slow_period=macd.get('slow_period', 26),
+                    macd_signal_period=macd.get('signal_period', 9),
+                    adx_period=adx.get('period', 14),
+                    adx_threshold=adx.get('threshold', 25.0),
+                    bb_period=bb.get('period', 20),
+                    bb_std_dev=bb.get('std_dev', 2.0),
+                    rsi_period=rsi.get('period', 14),
+                    rsi_overbought=rsi.get('overbought', 70.0),
+                    rsi_oversold=rsi.get('oversold', 30.0)
                 )
                 
                 self.system_config = SystemConfig(
@@ -306,11 +399,16 @@ class MultiUserConfigManager:
                     web_host=web_data.get('host', '0.0.0.0'),
                     log_level=system_data.get('log_level', 'INFO'),
                     timezone=system_data.get('timezone', 'UTC'),
+                    trend_max_workers=system_data.get('trend_max_workers', 0),
+                    fluctuation_batch_window_seconds=system_data.get('fluctuation_batch_window_seconds', 0),
                     trend_analysis=trend_analysis,
                     stock_pools=data.get('stock_pools', {})
                 )
                 
-                logging.info("系统配置加载成功")
+                self._system_sig = sig
+                # 股票池可能变化，用户配置需要重新展开
+                self._users_sig = None
+                logging.debug("系统配置加载成功")
                 return True
             else:
                 logging.info("系统配置文件不存在，创建默认配置")
@@ -366,8 +464,12 @@ class MultiUserConfigManager:
                         'trend': trend_data
                     }
                 
+                # 保持字段插入顺序，先序列化再一次性写入
+                buf = yaml.dump(data, Dumper=_Dumper, default_flow_style=False,
+                                allow_unicode=True, indent=2, sort_keys=False)
                 with open(self.config_file, 'w', encoding='utf-8') as f:
-                    yaml.dump(data, f, default_flow_style=False, allow_unicode=True, indent=2)
+                    f.write(buf)
+                self._users_sig = None
                 
                 logging.info("用户配置保存成功")
                 self._notify_config_change()
@@ -394,7 +496,9 @@ class MultiUserConfigManager:
                     },
                     'system': {
                         'log_level': self.system_config.log_level,
-                        'timezone': self.system_config.timezone
+                        'timezone': self.system_config.timezone,
+                        'trend_max_workers': self.system_config.trend_max_workers,
+                        'fluctuation_batch_window_seconds': self.system_config.fluctuation_batch_window_seconds
                     },
                     'trend_analysis': {
                         'thresholds': {
@@ -434,8 +538,12 @@ class MultiUserConfigManager:
                     'stock_pools': self.system_config.stock_pools
                 }
                 
+                # 保持字段插入顺序，先序列化再一次性写入
+                buf = yaml.dump(data, Dumper=_Dumper, default_flow_style=False,
+                                allow_unicode=True, indent=2, sort_keys=False)
                 with open(self.system_config_file, 'w', encoding='utf-8') as f:
-                    yaml.dump(data, f, default_flow_style=False, allow_unicode=True, indent=2)
+                    f.write(buf)
+                self._system_sig = None
                 
                 logging.info("系统配置保存成功")
                 return True
@@ -459,11 +567,11 @@ class MultiUserConfigManager:
         """创建或更新用户配置"""
         try:
             with self._lock:
+                now = datetime.now().isoformat()
                 if email in self.users:
                     user_config = self.users[email]
-                    user_config.updated_at = datetime.now().isoformat()
                 else:
-                    user_config = UserConfig(email=email)
+                    user_config = UserConfig(email=email, created_at=now, updated_at=now)
                     self.users[email] = user_config
                 
                 # 更新用户属性
@@ -480,10 +588,13 @@ class MultiUserConfigManager:
                             setattr(user_config.trend, attr_name, value)
                 
                 # 展开股票池引用
-                user_config.fluctuation.symbols = self._expand_stock_symbols(user_config.fluctuation.symbols)
-                user_config.trend.symbols = self._expand_stock_symbols(user_config.trend.symbols)
+                if self._needs_expansion(user_config.fluctuation.symbols):
+                    user_config.fluctuation.symbols = self._expand_stock_symbols(user_config.fluctuation.symbols)
+                if self._needs_expansion(user_config.trend.symbols):
+                    user_config.trend.symbols = self._expand_stock_symbols(user_config.trend.symbols)
                 
-                user_config.updated_at = datetime.now().isoformat()
+                user_config.updated_at = now
+                self._rebuild_indexes()
                 logging.info(f"用户配置更新: {email}")
                 
                 return self.save_users_config()
@@ -497,6 +608,7 @@ class MultiUserConfigManager:
             with self._lock:
                 if email in self.users:
                     del self.users[email]
+                    self._rebuild_indexes()
                     logging.info(f"用户配置删除: {email}")
                     return self.save_users_config()
                 return False
@@ -504,48 +616,35 @@ class MultiUserConfigManager:
             logging.error(f"删除用户配置失败: {e}")
             return False
     
-    def get_all_users(self) -> Dict[str, UserConfig]:
-        """获取所有用户配置"""
-        with self._lock:
-            return self.users.copy()
+    def get_all_users(self) -> Mapping[str, UserConfig]:
+        """
+        获取所有用户配置的只读映射
+        映射本身是快照，之后新增或删除用户不会改变已返回的结果；
+        但其中的 UserConfig 是配置管理器和监控器使用的同一实例，不是副本，调用方不应修改
+        """
+        return self._users_snapshot
     
     def get_fluctuation_enabled_users(self) -> Dict[str, UserConfig]:
         """获取启用波动监控的用户"""
-        with self._lock:
-            return {email: user for email, user in self.users.items() 
-                   if user.fluctuation.enabled}
+        return dict(self._fluct_enabled)
     
     def get_trend_enabled_users(self) -> Dict[str, UserConfig]:
         """获取启用趋势监控的用户"""
-        with self._lock:
-            return {email: user for email, user in self.users.items() 
-                   if user.trend.enabled}
+        return dict(self._trend_enabled)
     
     def get_all_monitored_symbols(self) -> Set[str]:
         """获取所有用户监控的股票代码（去重）"""
-        symbols = set()
-        with self._lock:
-            for user in self.users.values():
-                if user.fluctuation.enabled:
-                    symbols.update(user.fluctuation.symbols)
-                if user.trend.enabled:
-                    # 过滤掉特殊标识符
-                    user_symbols = [s for s in user.trend.symbols if not s.startswith('TOP_')]
-                    symbols.update(user_symbols)
-        return symbols
+        return set(self._monitored_symbols)
     
     def get_users_for_symbol(self, symbol: str, monitor_type: str = 'fluctuation') -> List[UserConfig]:
         """获取监控指定股票的用户列表"""
-        users = []
-        with self._lock:
-            for user in self.users.values():
-                if monitor_type == 'fluctuation' and user.fluctuation.enabled:
-                    if symbol in user.fluctuation.symbols:
-                        users.append(user)
-                elif monitor_type == 'trend' and user.trend.enabled:
-                    if symbol in user.trend.symbols:
-                        users.append(user)
-        return users
+        if monitor_type == 'fluctuation':
+            index = self._symbol_to_fluct_users
+        elif monitor_type == 'trend':
+            index = self._symbol_to_trend_users
+        else:
+            return []
+        return list(index.get(symbol, ()))
     
     def update_system_config(self, **kwargs) -> bool:
         """更新系统配置"""
@@ -581,7 +680,7 @@ class MultiUserConfigManager:
 config_manager = MultiUserConfigManager()
 
 # 便捷函数
-def get_all_users() -> Dict[str, UserConfig]:
+def get_all_users() -> Mapping[str, UserConfig]:
     """获取所有用户配置"""
     return config_manager.get_all_users()
 
@@ -1,34 +1,158 @@
+import glob
+import heapq
+import json
+import os
+import threading
+import time
 import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
 import logging
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Tuple
 from src.config.config_manager import config_manager
 
-def fetch_volume(symbol):
+# 实时价格和历史数据的短期缓存（秒）
+PRICE_CACHE_TTL = 30
+HISTORY_CACHE_TTL = 300
+TOP_NASDAQ_CACHE_TTL = 3600  # 成交量排行在同一次盘前/盘后执行中被多个用户复用
+
+# 成交量排行的磁盘缓存目录，进程重启后在有效期内无需重新下载
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".ragoalert")
+
+_price_cache: Dict[str, Tuple[float, float]] = {}  # symbol -> (timestamp, price)
+_hist_cache: Dict[Tuple[str, str, str], Tuple[float, pd.DataFrame]] = {}  # (symbol, period, interval) -> (timestamp, data)
+# yf.download 拆分出的单支股票数据，列和索引格式与 Ticker.history 不同，因此与 _hist_cache 分开缓存
+_batch_hist_cache: Dict[Tuple[str, str, str], Tuple[float, pd.DataFrame]] = {}  # (symbol, period, interval) -> (timestamp, data)
+_top_nasdaq_cache: Dict[int, Tuple[float, List[str]]] = {}  # n -> (timestamp, symbols)
+_cache_lock = threading.Lock()
+
+# 被 Yahoo 限流时的重试等待时间（秒），指数退避
+RATE_LIMIT_RETRY_DELAYS = (0.5, 1.0, 2.0)
+
+def _with_backoff(func, *args, **kwargs):
+    """调用 yfinance，遇到限流（HTTP 429）时按指数退避重试"""
+    for delay in RATE_LIMIT_RETRY_DELAYS:
+        try:
+            return func(*args, **kwargs)
+        except YFRateLimitError:
+            logging.debug(f"Yahoo 限流，{delay} 秒后重试")
+            time.sleep(delay)
+    return func(*args, **kwargs)
+
+def get_top_nasdaq_by_volume(n=20) -> List[str]:
+    """
+    获取 NASDAQ 核心股票池中成交量最大的 n 支股票。
+    结果在内存和磁盘中缓存 TOP_NASDAQ_CACHE_TTL 秒，同一轮趋势分析的多个用户只下载一次
+    """
+    with _cache_lock:
+        cached = _top_nasdaq_cache.get(n)
+    if cached and time.time() - cached[0] < TOP_NASDAQ_CACHE_TTL:
+        return list(cached[1])
+
+    path = os.path.join(CACHE_DIR, f"top_nasdaq_{date.today().isoformat()}_{n}.json")
     try:
-        data = yf.Ticker(symbol).history(period='1d')
-        if not data.empty:
-            return symbol, data['Volume'].iloc[-1]
-    except Exception as e:
-        logging.warning(f"Failed to get volume for {symbol}: {e}")
-    return symbol, 0
+        mtime = os.path.getmtime(path)
+        if time.time() - mtime < TOP_NASDAQ_CACHE_TTL:
+            with open(path, 'r', encoding='utf-8') as f:
+                symbols = json.load(f)
+            with _cache_lock:
+                _top_nasdaq_cache[n] = (mtime, symbols)
+            return list(symbols)
+    except (OSError, ValueError):
+        pass
 
-def get_top_nasdaq_by_volume(n=20):
+    symbols = _fetch_top_nasdaq_by_volume(n)
+    if symbols:
+        with _cache_lock:
+            _top_nasdaq_cache[n] = (time.time(), symbols)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # 清理之前日期的缓存文件
+            for old_path in glob.glob(os.path.join(CACHE_DIR, f"top_nasdaq_*_{n}.json")):
+                if old_path != path:
+                    os.remove(old_path)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(symbols, f)
+        except OSError as e:
+            logging.debug(f"写入成交量排行缓存失败: {e}")
+    return list(symbols)
+
+def _fetch_top_nasdaq_by_volume(n: int) -> List[str]:
+    """下载 NASDAQ 核心股票池的最新成交量并取前 n 名"""
     volumes = {}
     # 获取NASDAQ核心股票池
     nasdaq_symbols = config_manager.system_config.stock_pools.get("NASDAQ_CORE", [
         "AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "META", "NFLX", "NVDA", "AMD", "INTC"
     ])
     
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = {executor.submit(fetch_volume, sym): sym for sym in nasdaq_symbols}
-        for future in as_completed(futures):
-            symbol, volume = future.result()
-            volumes[symbol] = volume
-    sorted_volumes = sorted(volumes.items(), key=lambda x: x[1], reverse=True)
-    return [symbol for symbol, vol in sorted_volumes[:n]]
+    # 一次批量请求获取所有股票的成交量
+    try:
+        data = yf.download(nasdaq_symbols, period='1d', interval='1d', group_by='ticker',
+                           threads=True, progress=False)
+    except Exception as e:
+        logging.warning(f"Failed to download volumes: {e}")
+        return []
+    
+    if isinstance(data.columns, pd.MultiIndex) and not data.empty:
+        # 取出所有股票的成交量列，前向填充后最后一行即各股票最新的有效成交量
+        volume = data.xs('Volume', axis=1, level=1)
+        latest = volume.ffill().to_numpy()[-1]
+        for sym, vol in zip(volume.columns, latest):
+            volumes[sym] = float(vol) if pd.notna(vol) else 0
+    top = heapq.nlargest(n, volumes.items(), key=lambda x: x[1])
+    return [symbol for symbol, vol in top]
+
+def _download_history(tickers: Tuple[str, ...], period: str, interval: str,
+                      prepost: bool = False) -> Dict[str, pd.DataFrame]:
+    """批量下载历史数据并按股票拆分"""
+    data = yf.download(list(tickers), period=period, interval=interval, group_by='ticker',
+                       prepost=prepost, threads=True, progress=False)
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        for sym in tickers:
+            if sym in available:
+                df = data[sym].dropna(how='all')
+                if not df.empty:
+                    frames[sym] = df
+    elif len(tickers) == 1:
+        frames[tickers[0]] = data.dropna(how='all')
+    return frames
+
+def fetch_history_batch(tickers: List[str], period: str = "90d", interval: str = "1d") -> Dict[str, pd.DataFrame]:
+    """
+    一次请求批量获取多支股票的历史数据。
+    :param tickers: 股票代码列表
+    :return: {股票代码: 历史数据 DataFrame}，获取失败的股票不包含在结果中
+    """
+    if not tickers:
+        return {}
+    # 按单支股票短期缓存，不同用户的股票列表有重叠时只下载缓存中没有的股票
+    now = time.time()
+    frames: Dict[str, pd.DataFrame] = {}
+    with _cache_lock:
+        for sym in tickers:
+            cached = _batch_hist_cache.get((sym, period, interval))
+            if cached and now - cached[0] < HISTORY_CACHE_TTL:
+                frames[sym] = cached[1]
+    missing = tuple(sym for sym in dict.fromkeys(tickers) if sym not in frames)
+    if missing:
+        try:
+            fetched = _download_history(missing, period, interval)
+        except Exception as e:
+            logging.error(f"批量获取历史数据失败: {e}")
+            fetched = {}
+        with _cache_lock:
+            # 清理已过期的缓存
+            for old_key in [k for k, v in _batch_hist_cache.items() if now - v[0] >= HISTORY_CACHE_TTL]:
+                del _batch_hist_cache[old_key]
+            for sym, df in fetched.items():
+                _batch_hist_cache[(sym, period, interval)] = (now, df)
+        frames.update(fetched)
+    return {sym: df.copy() for sym, df in frames.items()}
 
 def get_historical_data(symbol: str, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
     """
@@ -38,11 +162,20 @@ def get_historical_data(symbol: str, period: str = "1y", interval: str = "1d") -
     :param interval: 数据间隔 (e.g., "1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo")
     :return: 包含历史数据的 Pandas DataFrame
     """
+    key = (symbol, period, interval)
+    with _cache_lock:
+        cached = _hist_cache.get(key)
+    if cached and time.time() - cached[0] < HISTORY_CACHE_TTL:
+        return cached[1].copy()
+
     try:
         ticker = yf.Ticker(symbol)
-        data = ticker.history(period=period, interval=interval)
+        data = _with_backoff(ticker.history, period=period, interval=interval)
         if data.empty:
             logging.warning(f"未找到 {symbol} 的历史数据，或数据为空。")
+        else:
+            with _cache_lock:
+                _hist_cache[key] = (time.time(), data.copy())
         return data
     except Exception as e:
         logging.error(f"获取 {symbol} 历史数据失败: {e}")
@@ -54,15 +187,22 @@ def get_current_price(symbol: str) -> float:
     注意：yfinance 的实时数据可能不是严格的实时，而是有延迟的。
     对于高频监控，可能需要更专业的实时数据API。
     """
+    with _cache_lock:
+        cached = _price_cache.get(symbol)
+    if cached and time.time() - cached[0] < PRICE_CACHE_TTL:
+        return cached[1]
+
     try:
         ticker = yf.Ticker(symbol)
         # 使用 fast_info 获取最新价格，通常比 history(period='1m', interval='1m') 更快
         # 但 fast_info 可能不包含所有信息，且其 "last_price" 字段可能不是严格的实时交易价格
         # 对于盘中实时价格，通常需要查询 'regularMarketPrice' 或 'currentPrice'
         info = ticker.fast_info
-        price = info.last_price # 或者 info.regularMarketPrice
+        price = _with_backoff(lambda: info.last_price) # 或者 info.regularMarketPrice
         if price:
-            logging.info(f"获取 {symbol} 实时价格: {price}")
+            logging.debug(f"获取 {symbol} 实时价格: {price}")
+            with _cache_lock:
+                _price_cache[symbol] = (time.time(), price)
             return price
         else:
             logging.warning(f"未获取到 {symbol} 的实时价格。")
@@ -70,3 +210,44 @@ def get_current_price(symbol: str) -> float:
     except Exception as e:
         logging.error(f"获取 {symbol} 实时价格失败: {e}")
         return 0.0
+
+def get_current_prices(symbols: List[str]) -> Dict[str, float]:
+    """
+    批量获取多支股票的实时价格。
+    缓存未命中的股票通过一次分钟线批量请求（含盘前盘后）获取，取最后一根K线的收盘价，
+    结果写入实时价格缓存，随后的 get_current_price 调用可直接命中。
+    :param symbols: 股票代码列表
+    :return: {股票代码: 价格}，获取失败的股票不包含在结果中
+    """
+    prices = {}
+    missing = []
+    now = time.time()
+    with _cache_lock:
+        for symbol in dict.fromkeys(symbols):
+            cached = _price_cache.get(symbol)
+            if cached and now - cached[0] < PRICE_CACHE_TTL:
+                prices[symbol] = cached[1]
+            else:
+                missing.append(symbol)
+    if not missing:
+        return prices
+
+    try:
+        frames = _download_history(tuple(missing), '1d', '1m', prepost=True)
+    except Exception as e:
+        logging.error(f"批量获取实时价格失败: {e}")
+        return prices
+
+    fetched = {}
+    for symbol, df in frames.items():
+        close = df['Close'].dropna() if 'Close' in df else None
+        if close is not None and not close.empty and close.iat[-1] > 0:
+            fetched[symbol] = float(close.iat[-1])
+    if fetched:
+        now = time.time()
+        with _cache_lock:
+            for symbol, price in fetched.items():
+                _price_cache[symbol] = (now, price)
+        prices.update(fetched)
+    logging.debug(f"批量获取 {len(missing)} 支股票实时价格，成功 {len(fetched)} 支")
+    return prices
@@ -0,0 +1,241 @@
+"""
+技术指标计算内核
+每个指标都是对 float64 数组的单遍循环，使用 numba 即时编译并释放 GIL，
+多线程并发分析时可以真正并行；未安装 numba 时以普通 Python 函数运行，结果一致
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba 不可用时退化为普通函数
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True, nogil=True)
+def _first_valid(x):
+    """返回第一个非 NaN 元素的下标，全部为 NaN 时返回数组长度"""
+    for i in range(x.size):
+        if not np.isnan(x[i]):
+            return i
+    return x.size
+
+
+# 不启用 nnan/ninf：预热期依赖 NaN 判断，完整 fastmath 会把 isnan 优化掉
+@njit(cache=True, nogil=True, fastmath={'contract', 'arcp', 'nsz'})
+def _smooth(x, n, alpha):
+    """
+    以前 n 个有效值的简单平均为初值的递推平滑：s[i] = alpha * x[i] + (1 - alpha) * s[i-1]
+    开头的 NaN 会被跳过，输出在预热期内为 NaN
+    """
+    out = np.full(x.size, np.nan)
+    start = _first_valid(x)
+    if x.size - start < n:
+        return out
+    decay = 1.0 - alpha
+    s = 0.0
+    for i in range(start, start + n):
+        s += x[i]
+    s /= n
+    out[start + n - 1] = s
+    for i in range(start + n, x.size):
+        s = alpha * x[i] + decay * s
+        out[i] = s
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _ema(x, n):
+    """指数移动平均（EMA）"""
+    return _smooth(x, n, 2.0 / (n + 1.0))
+
+
+@njit(cache=True, nogil=True)
+def _rma(x, n):
+    """
+    Wilder 平滑移动平均（RMA），用于 ADX 和 RSI
+    与 pandas_ta.rma 即 ewm(alpha=1/n, adjust=True, min_periods=n) 一致：
+    从第一个有效值起按 (1 - alpha)^i 加权平均，而不是以前 n 个值的简单平均为初值
+    """
+    out = np.full(x.size, np.nan)
+    start = _first_valid(x)
+    decay = 1.0 - 1.0 / n
+    num = 0.0
+    den = 0.0
+    for i in range(start, x.size):
+        num = x[i] + decay * num
+        den = 1.0 + decay * den
+        if i >= start + n - 1:
+            out[i] = num / den
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _macd(x, fast=12, slow=26, signal=9):
+    """MACD，返回 (DIF, DEA, 柱状图)"""
+    macd = _ema(x, fast) - _ema(x, slow)
+    macd_signal = _ema(macd, signal)
+    return macd, macd_signal, macd - macd_signal
+
+
+@njit(cache=True, nogil=True)
+def _adx(high, low, close, n=14):
+    """ADX 趋势强度，返回 (ADX, +DI, -DI)"""
+    size = close.size
+    tr = np.full(size, np.nan)
+    plus_dm = np.full(size, np.nan)
+    minus_dm = np.full(size, np.nan)
+    for i in range(1, size):
+        tr[i] = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        up = high[i] - high[i - 1]
+        down = low[i - 1] - low[i]
+        plus_dm[i] = up if (up > down and up > 0.0) else 0.0
+        minus_dm[i] = down if (down > up and down > 0.0) else 0.0
+
+    atr = _rma(tr, n)
+    plus_sm = _rma(plus_dm, n)
+    minus_sm = _rma(minus_dm, n)
+
+    plus_di = np.full(size, np.nan)
+    minus_di = np.full(size, np.nan)
+    dx = np.full(size, np.nan)
+    for i in range(size):
+        if np.isnan(atr[i]):
+            continue
+        if atr[i] > 0.0:
+            plus_di[i] = 100.0 * plus_sm[i] / atr[i]
+            minus_di[i] = 100.0 * minus_sm[i] / atr[i]
+        else:
+            plus_di[i] = 0.0
+            minus_di[i] = 0.0
+        di_sum = plus_di[i] + minus_di[i]
+        dx[i] = 100.0 * abs(plus_di[i] - minus_di[i]) / di_sum if di_sum > 0.0 else 0.0
+
+    return _rma(dx, n), plus_di, minus_di
+
+
+@njit(cache=True, nogil=True)
+def _bbands(x, n=20, k=2.0):
+    """布林带（总体标准差），返回 (上轨, 中轨, 下轨)"""
+    size = x.size
+    upper = np.full(size, np.nan)
+    middle = np.full(size, np.nan)
+    lower = np.full(size, np.nan)
+    s = 0.0
+    sq = 0.0
+    for i in range(size):
+        s += x[i]
+        sq += x[i] * x[i]
+        if i >= n:
+            s -= x[i - n]
+            sq -= x[i - n] * x[i - n]
+        if i >= n - 1:
+            mean = s / n
+            var = sq / n - mean * mean
+            std = np.sqrt(var) if var > 0.0 else 0.0
+            middle[i] = mean
+            upper[i] = mean + k * std
+            lower[i] = mean - k * std
+    return upper, middle, lower
+
+
+@njit(cache=True, nogil=True)
+def _rsi(x, n=14):
+    """相对强弱指数（RSI），涨跌均为零时取中性值 50"""
+    size = x.size
+    gain = np.full(size, np.nan)
+    loss = np.full(size, np.nan)
+    for i in range(1, size):
+        diff = x[i] - x[i - 1]
+        gain[i] = diff if diff > 0.0 else 0.0
+        loss[i] = -diff if diff < 0.0 else 0.0
+
+    avg_gain = _rma(gain, n)
+    avg_loss = _rma(loss, n)
+    out = np.full(size, np.nan)
+    for i in range(size):
+        if np.isnan(avg_gain[i]):
+            continue
+        total = avg_gain[i] + avg_loss[i]
+        out[i] = 100.0 * avg_gain[i] / total if total > 0.0 else 50.0
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _score_rows(close, ema_short, ema_long, macd, macd_signal, macd_hist, macd_hist_diff,
+                adx, plus_di, minus_di, bb_upper, bb_middle, bb_lower, rsi,
+                adx_threshold, rsi_overbought, rsi_oversold, up_threshold, down_threshold,
+                w_ema, w_macd, w_adx, w_bb, w_rsi):
+    """
+    单次循环逐行评估各指标条件，同时累计趋势计数和买卖信号加权分数，不生成中间布尔数组
+    返回 (趋势标签, 买入分数, 卖出分数)；标签为 int8：1 表示 up，-1 表示 down，0 表示 flat
+    """
+    size = close.size
+    labels = np.zeros(size, dtype=np.int8)
+    buy = np.zeros(size)
+    sell = np.zeros(size)
+    for i in range(size):
+        up = 0
+        down = 0
+        b = 0.0
+        s = 0.0
+
+        # EMA
+        if ema_short[i] > ema_long[i]:
+            up += 1
+            b += w_ema
+        elif ema_short[i] < ema_long[i]:
+            down += 1
+            s += w_ema
+
+        # MACD：趋势看柱状图变化，信号看柱状图正负
+        if macd[i] > macd_signal[i]:
+            if macd_hist_diff[i] > 0.0:
+                up += 1
+            if macd_hist[i] > 0.0:
+                b += w_macd
+        elif macd[i] < macd_signal[i]:
+            if macd_hist_diff[i] < 0.0:
+                down += 1
+            if macd_hist[i] < 0.0:
+                s += w_macd
+
+        # ADX
+        if adx[i] > adx_threshold:
+            if plus_di[i] > minus_di[i]:
+                up += 1
+                b += w_adx
+            elif plus_di[i] < minus_di[i]:
+                down += 1
+                s += w_adx
+
+        # 布林带
+        if close[i] > bb_middle[i] and close[i] < bb_upper[i]:
+            up += 1
+        elif close[i] < bb_middle[i] and close[i] > bb_lower[i]:
+            down += 1
+        if close[i] > bb_middle[i] or close[i] < bb_lower[i]:
+            b += w_bb
+        if close[i] < bb_middle[i] or close[i] > bb_upper[i]:
+            s += w_bb
+
+        # RSI
+        if rsi[i] < rsi_overbought:
+            up += 1
+        if rsi[i] > rsi_oversold:
+            down += 1
+        if rsi[i] < rsi_oversold:
+            b += w_rsi
+        if rsi[i] > rsi_overbought:
+            s += w_rsi
+
+        if up >= up_threshold and up > down:
+            labels[i] = 1
+        elif down >= down_threshold and down > up:
+            labels[i] = -1
+        buy[i] = b
+        sell[i] = s
+    return labels, buy, sell
@@ -1,9 +1,14 @@
 from dataclasses import dataclass
-from typing import Tuple, Optional
+from typing import Iterator, Tuple, Optional, Union
 from datetime import datetime, timedelta
 from collections import deque
 import logging
 
+import numpy as np
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
 @dataclass
 class FluctuationAnalysisResult:
     """
@@ -15,6 +20,70 @@ class FluctuationAnalysisResult:
     percentage_change: float
     change_type: str # "上涨" 或 "下跌"
 
+class PriceHistory:
+    """
+    固定容量的价格环形缓冲区。
+    时间戳（微秒整数）和价格分别存放在预分配的 numpy 数组中，不为每个采样创建 datetime/float 对象；
+    对外保持 deque 的 append / len / 迭代接口，元素为 (timestamp, price) 元组。
+    """
+    __slots__ = ('maxlen', '_times', '_prices', '_head', '_count')
+
+    def __init__(self, maxlen: int = 60):
+        self.maxlen = maxlen
+        self._times = np.empty(maxlen, dtype=np.int64)
+        self._prices = np.empty(maxlen, dtype=np.float64)
+        self._head = 0  # 下一次写入的位置
+        self._count = 0
+
+    def append(self, entry: Tuple[datetime, float]):
+        """追加一个 (timestamp, price) 采样，写满后覆盖最旧的采样"""
+        timestamp, price = entry
+        self._times[self._head] = (timestamp - _EPOCH) // _MICROSECOND
+        self._prices[self._head] = price
+        self._head = (self._head + 1) % self.maxlen
+        if self._count < self.maxlen:
+            self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _ordered(self) -> Tuple[np.ndarray, np.ndarray]:
+        """按时间从旧到新排列的时间戳和价格"""
+        if self._count < self.maxlen:
+            return self._times[:self._count], self._prices[:self._count]
+        return np.roll(self._times, -self._head), np.roll(self._prices, -self._head)
+
+    @staticmethod
+    def _entry(time_us, price) -> Tuple[datetime, float]:
+        return _EPOCH + timedelta(microseconds=int(time_us)), float(price)
+
+    def __iter__(self) -> Iterator[Tuple[datetime, float]]:
+        times, prices = self._ordered()
+        return (self._entry(t, p) for t, p in zip(times, prices))
+
+    def __reversed__(self) -> Iterator[Tuple[datetime, float]]:
+        times, prices = self._ordered()
+        return (self._entry(t, p) for t, p in zip(times[::-1], prices[::-1]))
+
+    def latest_at_or_before(self, cutoff: datetime) -> Optional[Tuple[datetime, float]]:
+        """
+        二分查找不晚于 cutoff 的最新采样，没有则返回 None
+        直接在环形数组上查找，不复制重排：写满后 [:head] 是较新的一段，[head:] 是较旧的一段，各自有序；
+        时间窗口很短时结果几乎总在较新的一段中，找到即返回
+        """
+        key = (cutoff - _EPOCH) // _MICROSECOND
+        idx = int(np.searchsorted(self._times[:self._head], key, side='right')) - 1
+        if idx >= 0:
+            return self._entry(self._times[idx], self._prices[idx])
+        if self._count < self.maxlen:
+            return None
+        older = self._times[self._head:]
+        idx = int(np.searchsorted(older, key, side='right')) - 1
+        if idx < 0:
+            return None
+        return self._entry(older[idx], self._prices[self._head + idx])
+
+
 class FluctuationAnalyzer:
     """
     负责分析股票价格波动。
@@ -23,32 +92,39 @@ class FluctuationAnalyzer:
     @staticmethod
     def analyze_fluctuation(
         symbol: str,
-        price_history: deque[Tuple[datetime, float]],
+        price_history: Union[PriceHistory, deque[Tuple[datetime, float]]],
         current_price: float,
-        time_window_minutes: int = 1
+        time_window_minutes: int = 1,
+        now: Optional[datetime] = None
     ) -> Optional[FluctuationAnalysisResult]:
         """
         分析股票在指定时间窗口内的价格波动。
         :param symbol: 股票代码
-        :param price_history: 包含 (timestamp, price) 元组的 deque
+        :param price_history: 按时间顺序排列的 (timestamp, price) 采样，PriceHistory 或 deque
         :param current_price: 当前实时价格
         :param time_window_minutes: 价格比较的时间窗口（分钟）
+        :param now: 当前时间，批量分析时由调用方统一传入，默认取 datetime.now()
         :return: FluctuationAnalysisResult 对象，如果数据不足则返回 None
         """
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
 
         # 确保有足够的数据点进行比较
         if len(price_history) < 2:
             logging.debug(f"{symbol}: 历史数据点不足，无法分析波动。")
             return None
 
-        # 找到 time_window_minutes 分钟前的价格
-        initial_price_entry = None
-        for i in range(len(price_history) - 1, -1, -1):
-            timestamp, price = price_history[i]
-            if now - timestamp >= timedelta(minutes=time_window_minutes):
-                initial_price_entry = (timestamp, price)
-                break
+        # 从最新的记录向前找到 time_window_minutes 分钟前的价格；
+        # 价格按时间顺序追加，每分钟采样时通常只需检查最后一两条
+        cutoff = now - timedelta(minutes=time_window_minutes)
+        if isinstance(price_history, PriceHistory):
+            initial_price_entry = price_history.latest_at_or_before(cutoff)
+        else:
+            initial_price_entry = None
+            for entry in reversed(price_history):
+                if entry[0] <= cutoff:
+                    initial_price_entry = entry
+                    break
 
         if initial_price_entry is None:
             logging.debug(f"{symbol}: 尚未收集到足够 {time_window_minutes} 分钟前的价格数据。")
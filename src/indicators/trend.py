@@ -2,10 +2,15 @@ import logging
 from dataclasses import dataclass
 from typing import List, Optional
 
-import yfinance as yf
-import pandas_ta as ta
+import numpy as np
+import pandas as pd
 
 from src.config.config_manager import get_trend_analysis_config, TrendAnalysisConfig
+from src.data.yahoo import get_historical_data
+from src.indicators._kernels import _ema, _macd, _adx, _bbands, _rsi, _score_rows
+
+# _score_rows 趋势标签到趋势名称的映射
+_TREND_LABELS = {1: "up", -1: "down", 0: "flat"}
 
 @dataclass
 class IndicatorSnapshot:
@@ -37,121 +42,79 @@ class TrendAnalysisResult:
     signal: Optional[str] = None  # 新增
 
 
+def _warmup_rows(config: TrendAnalysisConfig) -> int:
+    """所有指标都有有效值的第一行下标（由各指标周期决定）"""
+    return max(
+        config.ema_short_period - 1,
+        config.ema_long_period - 1,
+        max(config.macd_fast_period, config.macd_slow_period) + config.macd_signal_period - 2,
+        2 * config.adx_period - 1,   # DX 从第 adx_period 行开始，再经一次平滑
+        config.bb_period - 1,
+        config.rsi_period,           # 涨跌幅从第 1 行开始
+    )
+
+
 def analyze_trend(symbol: str, window: int = 10, user_email: str = None,
-                  config: TrendAnalysisConfig = None) -> TrendAnalysisResult:
+                  config: TrendAnalysisConfig = None, df: Optional[pd.DataFrame] = None) -> TrendAnalysisResult:
     try:
         # 获取配置参数
         if config is None:
             config = get_trend_analysis_config(user_email)
         
-        df = yf.Ticker(symbol).history(period='90d', interval='1d')
-        if df.shape[0] < window + 30:
+        # 未传入预取数据时单独获取，经过限流重试和历史数据缓存
+        if df is None:
+            df = get_historical_data(symbol, period='90d', interval='1d')
+        # 在计算指标前检查有效收盘价数量，避免对稀疏或退市股票做无用计算
+        valid_rows = int(df['Close'].notna().sum()) if 'Close' in df else 0
+        if valid_rows < window + 30:
             logging.warning(f"{symbol} 数据不足")
             return TrendAnalysisResult(symbol=symbol, trends=[], error="数据不足")
+        if valid_rows < len(df):
+            # 去掉缺失收盘价的行，避免 NaN 在递推指标中向后传播
+            df = df.dropna(subset=['Close'])
 
         # === 使用配置的指标参数计算 ===
-        df['ema7'] = ta.ema(df['Close'], length=config.ema_short_period)
-        df['ema20'] = ta.ema(df['Close'], length=config.ema_long_period)
-
-        macd = ta.macd(df['Close'], fast=config.macd_fast_period, 
-                      slow=config.macd_slow_period, signal=config.macd_signal_period)
-        df = df.join(macd)
-
-        adx = ta.adx(df['High'], df['Low'], df['Close'], length=config.adx_period)
-        df[['adx', 'plus_di', 'minus_di']] = adx[[f'ADX_{config.adx_period}', f'DMP_{config.adx_period}', f'DMN_{config.adx_period}']]
-
-        bb = ta.bbands(df['Close'], length=config.bb_period, std=config.bb_std_dev)
-        df = df.join(bb)
-
-        df['rsi'] = ta.rsi(df['Close'], length=config.rsi_period)
-
-        df.dropna(inplace=True)
-        df = df.tail(window)
-
-        # === 判断条件 (量化为分数) ===
-        # Initialize score columns
-        df['up_score'] = 0
-        df['down_score'] = 0
-
-        # EMA Score
-        df['up_score'] += (df['ema7'] > df['ema20']).astype(int)
-        df['down_score'] += (df['ema7'] < df['ema20']).astype(int)
-
-        # MACD Score - 使用动态列名
-        macd_col = f'MACD_{config.macd_fast_period}_{config.macd_slow_period}_{config.macd_signal_period}'
-        macd_signal_col = f'MACDs_{config.macd_fast_period}_{config.macd_slow_period}_{config.macd_signal_period}'
-        macd_hist_col = f'MACDh_{config.macd_fast_period}_{config.macd_slow_period}_{config.macd_signal_period}'
-        
-        df['up_score'] += ((df[macd_col] > df[macd_signal_col]) & (df[macd_hist_col].diff() > 0)).astype(int)
-        df['down_score'] += ((df[macd_col] < df[macd_signal_col]) & (df[macd_hist_col].diff() < 0)).astype(int)
-
-        # ADX Score
-        df['up_score'] += ((df['adx'] > config.adx_threshold) & (df['plus_di'] > df['minus_di'])).astype(int)
-        df['down_score'] += ((df['adx'] > config.adx_threshold) & (df['plus_di'] < df['minus_di'])).astype(int)
-
-        # Bollinger Bands Score - 使用动态列名
-        bb_upper_col = f'BBU_{config.bb_period}_{config.bb_std_dev}'
-        bb_middle_col = f'BBM_{config.bb_period}_{config.bb_std_dev}'
-        bb_lower_col = f'BBL_{config.bb_period}_{config.bb_std_dev}'
-        
-        # For 'up': Close above middle band and within upper band
-        df['up_score'] += ((df['Close'] > df[bb_middle_col]) & (df['Close'] < df[bb_upper_col])).astype(int)
-        # For 'down': Close below middle band and within lower band
-        df['down_score'] += ((df['Close'] < df[bb_middle_col]) & (df['Close'] > df[bb_lower_col])).astype(int)
-
-        # RSI Score - 使用配置的阈值
-        df['up_score'] += (df['rsi'] < config.rsi_overbought).astype(int) # Not overbought is a positive sign for 'up'
-        df['down_score'] += (df['rsi'] > config.rsi_oversold).astype(int) # Not oversold is a positive sign for 'down'
+        close = df['Close'].to_numpy(dtype=np.float64)
+        high = df['High'].to_numpy(dtype=np.float64)
+        low = df['Low'].to_numpy(dtype=np.float64)
+
+        # 之后只使用 numpy 数组，不再使用 DataFrame
+        ema_short = _ema(close, config.ema_short_period)
+        ema_long = _ema(close, config.ema_long_period)
+        macd, macd_signal, macd_hist = _macd(
+            close, config.macd_fast_period, config.macd_slow_period, config.macd_signal_period)
+        adx, plus_di, minus_di = _adx(high, low, close, config.adx_period)
+        bb_upper, bb_middle, bb_lower = _bbands(close, config.bb_period, config.bb_std_dev)
+        rsi = _rsi(close, config.rsi_period)
+
+        # 跳过预热期，只保留最近 window 行
+        start = max(_warmup_rows(config), close.size - window)
+        (close, ema_short, ema_long, macd, macd_signal, macd_hist,
+         adx, plus_di, minus_di, bb_upper, bb_middle, bb_lower, rsi) = (
+            a[start:] for a in (close, ema_short, ema_long, macd, macd_signal, macd_hist,
+                                adx, plus_di, minus_di, bb_upper, bb_middle, bb_lower, rsi))
+        macd_hist_diff = np.diff(macd_hist, prepend=np.nan)
+
+        # === 判断条件 (量化为分数)：趋势计数与信号加权分数一次循环完成 ===
+        weights = config.signal_weights
+        labels, buy_score, sell_score = _score_rows(
+            close, ema_short, ema_long, macd, macd_signal, macd_hist, macd_hist_diff,
+            adx, plus_di, minus_di, bb_upper, bb_middle, bb_lower, rsi,
+            config.adx_threshold, config.rsi_overbought, config.rsi_oversold,
+            config.up_trend_threshold, config.down_trend_threshold,
+            float(weights['ema_cross']), float(weights['macd_cross']), float(weights['adx_strength']),
+            float(weights['bb_position']), float(weights['rsi_level']))
 
         # === 生成趋势列表 ===
-        trends = []
-        for i in range(len(df)):
-            current_up_score = df['up_score'].iloc[i]
-            current_down_score = df['down_score'].iloc[i]
-
-            if current_up_score >= config.up_trend_threshold and current_up_score > current_down_score:
-                trends.append("up")
-            elif current_down_score >= config.down_trend_threshold and current_down_score > current_up_score:
-                trends.append("down")
-            else:
-                trends.append("flat")
+        trends = [_TREND_LABELS[v] for v in labels.tolist()]
 
         # === 信号判断 (基于加权分数和阈值) ===
-        # Use weights from config
-        weights = config.signal_weights
-
-        # Calculate daily buy/sell scores
-        df['buy_signal_score'] = 0.0
-        df['sell_signal_score'] = 0.0
-
-        # EMA contribution
-        df['buy_signal_score'] += ((df['ema7'] > df['ema20']) * weights['ema_cross'])
-        df['sell_signal_score'] += ((df['ema7'] < df['ema20']) * weights['ema_cross'])
-
-        # MACD contribution - 使用动态列名
-        df['buy_signal_score'] += ((df[macd_col] > df[macd_signal_col]) & (df[macd_hist_col] > 0)) * weights['macd_cross']
-        df['sell_signal_score'] += ((df[macd_col] < df[macd_signal_col]) & (df[macd_hist_col] < 0)) * weights['macd_cross']
-
-        # ADX contribution (only if ADX indicates strong trend)
-        df['buy_signal_score'] += ((df['adx'] > config.adx_threshold) & (df['plus_di'] > df['minus_di'])) * weights['adx_strength']
-        df['sell_signal_score'] += ((df['adx'] > config.adx_threshold) & (df['plus_di'] < df['minus_di'])) * weights['adx_strength']
-
-        # Bollinger Bands contribution - 使用动态列名
-        # Buy: Close above middle band, approaching lower band (rebound) or breaking upper band (strong momentum)
-        df['buy_signal_score'] += ((df['Close'] > df[bb_middle_col]) | (df['Close'] < df[bb_lower_col])) * weights['bb_position']
-        # Sell: Close below middle band, approaching upper band (rejection) or breaking lower band (strong momentum)
-        df['sell_signal_score'] += ((df['Close'] < df[bb_middle_col]) | (df['Close'] > df[bb_upper_col])) * weights['bb_position']
-
-        # RSI contribution - 使用配置的阈值
-        df['buy_signal_score'] += (df['rsi'] < config.rsi_oversold) * weights['rsi_level'] # Oversold
-        df['sell_signal_score'] += (df['rsi'] > config.rsi_overbought) * weights['rsi_level'] # Overbought
-
         # Use signal thresholds from config
         buy_threshold = config.buy_signal_threshold
         sell_threshold = config.sell_signal_threshold
 
-        latest_buy_score = df['buy_signal_score'].iloc[-1]
-        latest_sell_score = df['sell_signal_score'].iloc[-1]
+        latest_buy_score = buy_score[-1]
+        latest_sell_score = sell_score[-1]
 
         if latest_buy_score >= buy_threshold and latest_buy_score > latest_sell_score:
             signal = "buy"
@@ -161,24 +124,24 @@ def analyze_trend(symbol: str, window: int = 10, user_email: str = None,
             signal = "hold" # Default or if scores are not decisive
 
         # === 构建快照 ===
-        latest = df.iloc[-1]
+        # 直接读取各指标数组的最后一个元素
         snapshot = IndicatorSnapshot(
-            ema7=latest['ema7'],
-            ema20=latest['ema20'],
-            macd=latest[macd_col],
-            macd_signal=latest[macd_signal_col],
-            macd_hist=latest[macd_hist_col],
-            adx=latest['adx'],
-            plus_di=latest['plus_di'],
-            minus_di=latest['minus_di'],
-            bb_upper=latest[bb_upper_col],
-            bb_middle=latest[bb_middle_col],
-            bb_lower=latest[bb_lower_col],
-            close=latest['Close'],
-            rsi=latest['rsi']
+            ema7=ema_short[-1],
+            ema20=ema_long[-1],
+            macd=macd[-1],
+            macd_signal=macd_signal[-1],
+            macd_hist=macd_hist[-1],
+            adx=adx[-1],
+            plus_di=plus_di[-1],
+            minus_di=minus_di[-1],
+            bb_upper=bb_upper[-1],
+            bb_middle=bb_middle[-1],
+            bb_lower=bb_lower[-1],
+            close=close[-1],
+            rsi=rsi[-1]
         )
 
-        logging.info(f"[{symbol}] 趋势: {trends}, Signal: {signal}, Buy Score: {latest_buy_score:.2f}, Sell Score: {latest_sell_score:.2f}, 收盘: {latest['Close']:.2f}")
+        logging.info(f"[{symbol}] 趋势: {trends}, Signal: {signal}, Buy Score: {latest_buy_score:.2f}, Sell Score: {latest_sell_score:.2f}, 收盘: {close[-1]:.2f}")
         return TrendAnalysisResult(symbol=symbol, trends=trends, indicators=snapshot, signal=signal)
 
     except Exception as e:
@@ -3,15 +3,19 @@
 重构为只处理单个用户的波动监控逻辑
 """
 
+import copy
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict
-from collections import deque
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 
 from src.config.config_manager import UserConfig, get_system_config
 from src.data.yahoo import get_current_price
-from src.notifiers.email import send_gmail, build_fluctuation_email_content
-from src.indicators.fluctuation import FluctuationAnalyzer, FluctuationAnalysisResult
+from src.notifiers.email import send_gmail, build_fluctuation_email_content, BatchingNotifier
+from src.indicators.fluctuation import FluctuationAnalyzer, FluctuationAnalysisResult, PriceHistory
+
+# 所有监控器共用的价格获取线程池，避免每轮检查重复创建线程
+_price_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="price-fetch")
 
 
 class FluctuationMonitor:
@@ -27,15 +31,19 @@ class FluctuationMonitor:
         Args:
             user_config: 用户配置对象
         """
-        self.user_config = user_config
+        # 保存配置副本：配置管理器会原地修改用户配置，管理器靠副本判断配置是否变化
+        self.user_config = copy.deepcopy(user_config)
         # 存储该用户监控股票的历史价格
-        self._price_history: Dict[str, deque] = {}
+        self._price_history: Dict[str, PriceHistory] = {}
         # 记录该用户每个股票的上次通知时间
         self._last_notification_time: Dict[str, datetime] = {}
+        # 按系统配置的窗口合并多轮检查触发的提醒，窗口为 0 时立即发送
+        self._notifier = BatchingNotifier(
+            self.send_notification, get_system_config().fluctuation_batch_window_seconds)
         
         # 初始化价格历史
         for symbol in self.user_config.fluctuation.symbols:
-            self._price_history[symbol] = deque(maxlen=60)  # 存储最近60分钟的价格
+            self._price_history[symbol] = PriceHistory(maxlen=60)  # 存储最近60分钟的价格
             self._last_notification_time[symbol] = datetime.min
         
         logging.info(f"初始化用户 {self.user_config.email} 的波动监控器，监控股票: {self.user_config.fluctuation.symbols}")
@@ -59,26 +67,35 @@ class FluctuationMonitor:
         
         # 为新增的股票初始化历史数据
         for symbol in new_symbols - old_symbols:
-            self._price_history[symbol] = deque(maxlen=60)
+            self._price_history[symbol] = PriceHistory(maxlen=60)
             self._last_notification_time[symbol] = datetime.min
         
-        self.user_config = new_user_config
+        self.user_config = copy.deepcopy(new_user_config)
         logging.info(f"更新用户 {self.user_config.email} 的波动监控配置")
     
-    def check_fluctuations(self) -> List[FluctuationAnalysisResult]:
+    def check_fluctuations(self, now: Optional[datetime] = None) -> List[FluctuationAnalysisResult]:
         """
         检查该用户监控股票的波动情况
         返回触发通知条件的波动分析结果列表
+        
+        Args:
+            now: 本轮采样时间戳，默认取当前时间；监控循环传入整分钟调度时刻，
+                 保证相邻采样间隔为整 1 分钟
         """
         if not self.user_config.fluctuation.enabled:
             return []
             
         fluctuation_results = []
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
+        symbols = self.user_config.fluctuation.symbols
         
-        for symbol in self.user_config.fluctuation.symbols:
+        # 并发获取实时价格，分析逻辑仍在当前线程中顺序执行
+        prices = dict(zip(symbols, _price_pool.map(get_current_price, symbols)))
+        
+        for symbol in symbols:
             try:
-                current_price = get_current_price(symbol)
+                current_price = prices[symbol]
                 if current_price == 0.0:
                     logging.warning(f"用户 {self.user_config.email}: 无法获取 {symbol} 的实时价格，跳过。")
                     continue
@@ -91,7 +108,8 @@ class FluctuationMonitor:
                     symbol=symbol,
                     price_history=self._price_history[symbol],
                     current_price=current_price,
-                    time_window_minutes=1
+                    time_window_minutes=1,
+                    now=now
                 )
 
                 if analysis_result is None:
@@ -131,7 +149,8 @@ class FluctuationMonitor:
             return False
             
         try:
-            subject = f"🚨 股票波动提醒 - {self.user_config.name or self.user_config.email}"
+            recipient_name = self.user_config.name or self.user_config.email
+            subject = f"🚨 股票波动提醒 - {recipient_name}"
             html_body = build_fluctuation_email_content(fluctuation_results)
             system_config = get_system_config()
             
@@ -151,18 +170,46 @@ class FluctuationMonitor:
             logging.error(f"向用户 {self.user_config.email} 发送邮件失败: {e}")
             return False
     
-    def run_once(self) -> bool:
+    def run_once(self, now: Optional[datetime] = None) -> bool:
         """
-        执行一次波动检查和通知
+        执行一次波动检查，触发的提醒交给合并通知器在窗口结束时发送
+        
+        Args:
+            now: 本轮采样时刻，默认为当前时间
         
         Returns:
-            是否发送了通知
+            本轮是否触发了提醒（已加入待发送队列），不表示邮件已发出；
+            合并窗口为 0 时提醒会立即发送，发送结果见日志
         """
-        fluctuation_results = self.check_fluctuations()
+        fluctuation_results = self.check_fluctuations(now)
         if fluctuation_results:
-            return self.send_notification(fluctuation_results)
+            self._notifier.add(fluctuation_results)
+            return True
         return False
     
+    def flush_notifications(self) -> bool:
+        """
+        立即发送合并窗口内尚未发出的提醒
+        
+        Returns:
+            是否发送了通知
+        """
+        return self._notifier.flush()
+    
+    def discard_notifications(self) -> int:
+        """
+        丢弃合并窗口内尚未发出的提醒，监控器被停用或移除时调用
+        
+        Returns:
+            丢弃的提醒数量
+        """
+        return self._notifier.discard()
+    
+    @property
+    def notifier(self) -> BatchingNotifier:
+        """该用户的提醒合并器"""
+        return self._notifier
+    
     def get_status(self) -> Dict:
         """
         获取监控器状态信息
@@ -177,6 +224,7 @@ class FluctuationMonitor:
             "threshold_percent": self.user_config.fluctuation.threshold_percent,
             "notification_interval_minutes": self.user_config.fluctuation.notification_interval_minutes,
             "monitored_symbols": self.user_config.fluctuation.symbols,
+            "pending_notifications": self._notifier.pending_count,
             "price_history_count": {symbol: len(history) for symbol, history in self._price_history.items()},
             "last_notification_times": {
                 symbol: time.isoformat() if time != datetime.min else None 
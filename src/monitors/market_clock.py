@@ -0,0 +1,65 @@
+"""
+美股交易时钟
+统一计算美东时间与 UTC 的时差（由 pytz 处理夏令时切换）和各交易时段的 UTC 时间，
+结果按日期缓存，供波动监控和趋势监控共用；另提供波动监控每轮采样使用的整分钟时刻
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Tuple
+
+import pytz
+
+_NY_TZ = pytz.timezone("America/New_York")
+
+
+@lru_cache(maxsize=8)
+def us_eastern_offset_hours(day: date) -> int:
+    """
+    指定日期美东时间落后 UTC 的小时数：夏令时为 4，冬令时为 5
+    夏令时在凌晨 2 点切换，取当天中午的时差即为交易时段内的时差
+    """
+    noon = _NY_TZ.localize(datetime(day.year, day.month, day.day, 12))
+    return -int(noon.utcoffset().total_seconds() // 3600)
+
+
+@lru_cache(maxsize=8)
+def market_windows_for_date(day: date) -> Tuple[datetime, datetime, datetime, datetime]:
+    """
+    计算指定日期美股各时段的 UTC 时间（不带时区信息，与 datetime.utcnow() 比较）
+    盘前 4:00 - 9:30，盘中 9:30 - 16:00，盘后 16:00 - 20:00（美东时间）
+    返回 (盘前开始, 开盘, 收盘, 盘后结束)
+    """
+    def to_utc(hour: int, minute: int = 0) -> datetime:
+        local = _NY_TZ.localize(datetime(day.year, day.month, day.day, hour, minute))
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return to_utc(4), to_utc(9, 30), to_utc(16), to_utc(20)
+
+
+def minute_tick(now: datetime) -> datetime:
+    """
+    返回 now 所在轮次的整分钟调度时刻，作为该轮波动采样的时间戳
+    等待到整分钟时可能提前几毫秒或推迟一段时间被唤醒，先加 1 秒再向下取整，
+    使相邻两轮的采样时间始终相差整 1 分钟，不受唤醒误差和预取耗时影响
+    """
+    return (now + timedelta(seconds=1)).replace(second=0, microsecond=0)
+
+
+def next_eastern_time(now_utc: datetime, *times: Tuple[int, int]) -> datetime:
+    """
+    返回 now_utc 之后最近的一个工作日指定美东时刻（UTC，不带时区信息）
+    :param times: 一个或多个 (时, 分) 美东时刻
+    """
+    # 从前一天开始查找，覆盖 UTC 日期已跨天而美东仍是前一天的情况
+    start = now_utc.date() - timedelta(days=1)
+    for i in range(9):
+        day = start + timedelta(days=i)
+        if day.weekday() >= 5:
+            continue
+        offset = timedelta(hours=us_eastern_offset_hours(day))
+        for hour, minute in sorted(times):
+            candidate = datetime(day.year, day.month, day.day, hour, minute) + offset
+            if candidate > now_utc:
+                return candidate
+    raise ValueError("未指定美东时刻")
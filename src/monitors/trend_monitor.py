@@ -3,15 +3,39 @@
 重构为只处理单个用户的趋势监控逻辑
 """
 
+import copy
 import logging
+import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Tuple, List, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from src.config.config_manager import UserConfig, get_system_config
-from src.data.yahoo import get_top_nasdaq_by_volume
+from src.data.yahoo import get_top_nasdaq_by_volume, fetch_history_batch
 from src.indicators.trend import analyze_trend, TrendAnalysisResult
 from src.notifiers.email import send_gmail, build_trend_email_content
+from src.monitors.market_clock import us_eastern_offset_hours
+
+# 没有趋势变化时，最长间隔多久仍发送一次趋势邮件
+REPORT_HEARTBEAT_INTERVAL = timedelta(days=7)
+
+_analysis_pool: Optional[ThreadPoolExecutor] = None
+_analysis_pool_lock = threading.Lock()
+
+
+def _get_analysis_pool() -> ThreadPoolExecutor:
+    """
+    所有用户共享的趋势分析线程池，首次使用时按系统配置创建
+    指标内核释放 GIL，未配置线程数时按 CPU 核数设置（4 到 16 之间）；
+    批量数据中缺失的股票会单独联网获取，因此下限保留 4 个线程
+    """
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            max_workers = get_system_config().trend_max_workers or min(16, max(4, os.cpu_count() or 4))
+            _analysis_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trend-analysis")
+        return _analysis_pool
 
 
 class TrendMonitor:
@@ -27,12 +51,15 @@ class TrendMonitor:
         Args:
             user_config: 用户配置对象
         """
-        self.user_config = user_config
+        # 保存配置副本：配置管理器会原地修改用户配置，管理器靠副本判断配置是否变化
+        self.user_config = copy.deepcopy(user_config)
         # 记录该用户的上次执行时间
         self._last_run_time: Dict[str, datetime] = {
             "pre_market": datetime.min,
             "post_market": datetime.min
         }
+        # 上次发送趋势邮件的时间
+        self._last_report_time = datetime.min
         
         logging.info(f"初始化用户 {self.user_config.email} 的趋势监控器，监控股票: {self.user_config.trend.symbols}")
     
@@ -43,7 +70,7 @@ class TrendMonitor:
         Args:
             new_user_config: 新的用户配置
         """
-        self.user_config = new_user_config
+        self.user_config = copy.deepcopy(new_user_config)
         logging.info(f"更新用户 {self.user_config.email} 的趋势监控配置")
     
     @staticmethod
@@ -55,21 +82,25 @@ class TrendMonitor:
         if len(trend_list) < window:
             return None
 
-        recent = trend_list[-window:]
-        if len(set(recent)) == 1:
-            return None
+        # 默认窗口只需比较最后两天
+        if window == 2:
+            prev, curr = trend_list[-2], trend_list[-1]
+            return (prev, curr) if prev != curr else None
 
+        # 直接按下标比较相邻元素，不创建切片和集合
         for i in range(-window + 1, 0):
-            if recent[i] != recent[i - 1]:
-                return recent[i - 1], recent[i]
+            if trend_list[i] != trend_list[i - 1]:
+                return trend_list[i - 1], trend_list[i]
         return None
     
     @staticmethod
-    def _is_us_market_time(target_hour_utc: int, target_minute_utc: int, tolerance_minutes: int = 5) -> bool:
+    def _is_us_market_time(target_hour_utc: int, target_minute_utc: int, tolerance_minutes: int = 5,
+                           now_utc: Optional[datetime] = None) -> bool:
         """
         检查当前 UTC 时间是否在指定的美股交易相关时间点附近
         """
-        now_utc = datetime.utcnow()
+        if now_utc is None:
+            now_utc = datetime.utcnow()
         target_time_utc = now_utc.replace(hour=target_hour_utc, minute=target_minute_utc, second=0, microsecond=0)
 
         if now_utc.weekday() >= 5:  # 周末不执行
@@ -77,32 +108,34 @@ class TrendMonitor:
 
         return abs((now_utc - target_time_utc).total_seconds()) <= tolerance_minutes * 60
     
-    def _should_run_analysis(self, market_session: str) -> bool:
+    def _should_run_analysis(self, market_session: str, now: Optional[datetime] = None) -> bool:
         """
         判断是否应该执行趋势分析
         
         Args:
             market_session: 'pre_market' 或 'post_market'
+            now: 当前 UTC 时间，默认取 datetime.utcnow()
             
         Returns:
             是否应该执行
         """
-        now = datetime.utcnow()
-        is_daylight_saving = 3 <= now.month <= 10
+        if now is None:
+            now = datetime.utcnow()
+        offset_hours = us_eastern_offset_hours(now.date())
         
         if market_session == "pre_market":
             if not self.user_config.trend.pre_market_notification:
                 return False
-            target_hour = 13 if is_daylight_saving else 14
+            target_hour = 9 + offset_hours  # 美东时间 9:00
         elif market_session == "post_market":
             if not self.user_config.trend.post_market_notification:
                 return False
-            target_hour = 21 if is_daylight_saving else 22
+            target_hour = 17 + offset_hours  # 美东时间 17:00
         else:
             return False
         
         # 检查是否在目标时间附近
-        if not self._is_us_market_time(target_hour, 0):
+        if not self._is_us_market_time(target_hour, 0, now_utc=now):
             return False
         
         # 检查距离上次执行是否超过23小时
@@ -127,6 +160,8 @@ class TrendMonitor:
         if "TOP_NASDAQ" in symbols:
             symbols.remove("TOP_NASDAQ")
             symbols.extend(get_top_nasdaq_by_volume(20))
+            # 热门股票可能与用户配置的股票重复，去重后只下载和分析一次
+            symbols = list(dict.fromkeys(symbols))
         
         logging.info(f"用户 {self.user_config.email} 趋势分析开始，监控股票: {symbols}")
         
@@ -135,30 +170,37 @@ class TrendMonitor:
         results: Dict[str, TrendAnalysisResult] = {}
         
         try:
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                futures = {executor.submit(analyze_trend, sym, user_email=self.user_config.email): sym for sym in symbols}
-                for future in as_completed(futures):
-                    try:
-                        result: TrendAnalysisResult = future.result(timeout=60)
-                        symbol = result.symbol
-                        
-                        if not result.trends or len(result.trends) < 2:
-                            continue
-                        
-                        current_trend = result.trends[-1]
-                        trends[symbol] = current_trend
-                        results[symbol] = result
-                        
-                        change = self.detect_trend_change(result.trends)
-                        if change:
-                            changes[symbol] = change
-                            logging.info(f"用户 {self.user_config.email}: {symbol} 趋势变化: {change[0]} → {change[1]}")
-                        else:
-                            logging.debug(f"用户 {self.user_config.email}: {symbol} 趋势未变: {current_trend}")
-                            
-                    except Exception as e:
-                        logging.error(f"用户 {self.user_config.email}: 分析股票趋势失败: {e}")
+            # 一次批量请求获取所有股票的历史数据；批量结果中缺失的股票由 analyze_trend
+            # 通过 get_historical_data 单独获取（同样带缓存和限流重试）
+            frames = fetch_history_batch(symbols)
+            # 多个用户的分析任务共用同一个线程池，总并发数不随用户数增长
+            executor = _get_analysis_pool()
+            futures = {
+                executor.submit(analyze_trend, sym, user_email=self.user_config.email, df=frames.get(sym)): sym
+                for sym in symbols
+            }
+            for future in as_completed(futures):
+                try:
+                    result: TrendAnalysisResult = future.result(timeout=60)
+                    symbol = result.symbol
+                    
+                    if not result.trends or len(result.trends) < 2:
                         continue
+                    
+                    current_trend = result.trends[-1]
+                    trends[symbol] = current_trend
+                    results[symbol] = result
+                    
+                    change = self.detect_trend_change(result.trends)
+                    if change:
+                        changes[symbol] = change
+                        logging.info(f"用户 {self.user_config.email}: {symbol} 趋势变化: {change[0]} → {change[1]}")
+                    else:
+                        logging.debug(f"用户 {self.user_config.email}: {symbol} 趋势未变: {current_trend}")
+                        
+                except Exception as e:
+                    logging.error(f"用户 {self.user_config.email}: 分析股票趋势失败: {e}")
+                    continue
             
             if trends:
                 return {
@@ -231,31 +273,45 @@ class TrendMonitor:
                 success = self.send_notification(analysis_data)
                 if success:
                     self._last_run_time["pre_market"] = now  # 记录执行时间
+                    self._last_report_time = now
                 return success
             return False
         
         # 检查是否应该执行盘前分析
-        if self._should_run_analysis("pre_market"):
+        if self._should_run_analysis("pre_market", now):
             logging.info(f"用户 {self.user_config.email}: 检测到美股盘前执行时间，开始趋势分析...")
             analysis_data = self._execute_trend_analysis()
             if analysis_data:
-                success = self.send_notification(analysis_data)
-                if success:
-                    self._last_run_time["pre_market"] = now
-                return success
+                return self._notify_if_changed(analysis_data, "pre_market", now)
         
         # 检查是否应该执行盘后分析
-        if self._should_run_analysis("post_market"):
+        if self._should_run_analysis("post_market", now):
             logging.info(f"用户 {self.user_config.email}: 检测到美股盘后执行时间，开始趋势分析...")
             analysis_data = self._execute_trend_analysis()
             if analysis_data:
-                success = self.send_notification(analysis_data)
-                if success:
-                    self._last_run_time["post_market"] = now
-                return success
+                return self._notify_if_changed(analysis_data, "post_market", now)
         
         return False
     
+    def _notify_if_changed(self, analysis_data: Dict, market_session: str, now: datetime) -> bool:
+        """
+        定时分析后发送通知：没有趋势变化时跳过邮件，
+        但距离上次发送超过 REPORT_HEARTBEAT_INTERVAL 时仍发送一次，确认监控正常运行
+        
+        Returns:
+            是否发送了通知
+        """
+        if not analysis_data["changes"] and now - self._last_report_time < REPORT_HEARTBEAT_INTERVAL:
+            logging.info(f"用户 {self.user_config.email}: 没有趋势变化，跳过本次趋势邮件")
+            self._last_run_time[market_session] = now
+            return False
+        
+        success = self.send_notification(analysis_data)
+        if success:
+            self._last_run_time[market_session] = now
+            self._last_report_time = now
+        return success
+    
     def get_status(self) -> Dict:
         """
         获取监控器状态信息
@@ -273,5 +329,6 @@ class TrendMonitor:
             "last_run_times": {
                 session: time.isoformat() if time != datetime.min else None
                 for session, time in self._last_run_time.items()
-            }
+            },
+            "last_report_time": self._last_report_time.isoformat() if self._last_report_time != datetime.min else None
         }
\ No newline at end of file
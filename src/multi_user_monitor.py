@@ -6,13 +6,16 @@
 import logging
 import time
 import threading
-from datetime import datetime, timedelta
-from typing import Dict, List, Set
+from datetime import datetime
+from typing import Dict, List, Optional, Set
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from src.config.config_manager import config_manager, UserConfig
+from src.data.yahoo import get_current_prices
 from src.monitors.fluctuation_monitor import FluctuationMonitor
 from src.monitors.trend_monitor import TrendMonitor
+from src.monitors.market_clock import market_windows_for_date, minute_tick, next_eastern_time
+from src.notifiers.email import flush_notifiers
 
 
 class MultiUserMonitorManager:
@@ -25,6 +28,7 @@ class MultiUserMonitorManager:
         self.fluctuation_monitors: Dict[str, FluctuationMonitor] = {}  # email -> FluctuationMonitor
         self.trend_monitors: Dict[str, TrendMonitor] = {}  # email -> TrendMonitor
         self._running = False
+        self._stop_event = threading.Event()  # stop() 时唤醒正在等待的监控线程
         self._fluctuation_thread = None
         self._trend_thread = None
         
@@ -49,31 +53,30 @@ class MultiUserMonitorManager:
         
         # 创建波动监控器
         if user_config.fluctuation.enabled:
-            if email not in self.fluctuation_monitors:
+            monitor = self.fluctuation_monitors.get(email)
+            if monitor is None:
                 self.fluctuation_monitors[email] = FluctuationMonitor(user_config)
                 logging.info(f"创建用户 {email} 的波动监控器")
-            else:
-                # 更新现有监控器的配置
-                self.fluctuation_monitors[email].update_config(user_config)
-        else:
-            # 如果禁用了波动监控，移除监控器
-            if email in self.fluctuation_monitors:
-                del self.fluctuation_monitors[email]
-                logging.info(f"移除用户 {email} 的波动监控器")
+            elif monitor.user_config != user_config:
+                # 配置有变化时才更新现有监控器，重新加载时大多数用户的配置不变
+                monitor.update_config(user_config)
+        elif email in self.fluctuation_monitors:
+            # 如果禁用了波动监控，移除监控器并丢弃尚未发出的提醒
+            self.fluctuation_monitors.pop(email).discard_notifications()
+            logging.info(f"移除用户 {email} 的波动监控器")
         
         # 创建趋势监控器
         if user_config.trend.enabled:
-            if email not in self.trend_monitors:
+            monitor = self.trend_monitors.get(email)
+            if monitor is None:
                 self.trend_monitors[email] = TrendMonitor(user_config)
                 logging.info(f"创建用户 {email} 的趋势监控器")
-            else:
-                # 更新现有监控器的配置
-                self.trend_monitors[email].update_config(user_config)
-        else:
+            elif monitor.user_config != user_config:
+                # 配置有变化时才更新现有监控器
+                monitor.update_config(user_config)
+        elif self.trend_monitors.pop(email, None) is not None:
             # 如果禁用了趋势监控，移除监控器
-            if email in self.trend_monitors:
-                del self.trend_monitors[email]
-                logging.info(f"移除用户 {email} 的趋势监控器")
+            logging.info(f"移除用户 {email} 的趋势监控器")
     
     def _on_config_change(self, users: Dict[str, UserConfig]):
         """配置变更回调函数"""
@@ -86,7 +89,7 @@ class MultiUserMonitorManager:
         
         # 移除不再存在的用户监控器
         for email in current_fluctuation_users - new_users:
-            del self.fluctuation_monitors[email]
+            self.fluctuation_monitors.pop(email).discard_notifications()
             logging.info(f"移除已删除用户 {email} 的波动监控器")
         
         for email in current_trend_users - new_users:
@@ -97,34 +100,18 @@ class MultiUserMonitorManager:
         for email, user_config in users.items():
             self._create_user_monitors(user_config)
     
-    def _is_us_market_open_or_pre_post(self) -> bool:
+    def _is_us_market_open_or_pre_post(self, now_utc: Optional[datetime] = None) -> bool:
         """判断当前时间是否在美股交易时段（包括盘前盘后）内"""
-        now_utc = datetime.utcnow()
-        is_daylight_saving = 3 <= now_utc.month <= 10
-        
-        if is_daylight_saving:
-            # 夏令时：美东时间 = UTC - 4小时
-            # 盘前：UTC 8:00 - 13:30，盘中：UTC 13:30 - 20:00，盘后：UTC 20:00 - 00:00
-            market_open_utc = now_utc.replace(hour=13, minute=30, second=0, microsecond=0)
-            market_close_utc = now_utc.replace(hour=20, minute=0, second=0, microsecond=0)
-            pre_market_open_utc = now_utc.replace(hour=8, minute=0, second=0, microsecond=0)
-            post_market_close_utc = now_utc.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-        else:
-            # 冬令时：美东时间 = UTC - 5小时
-            # 盘前：UTC 9:00 - 14:30，盘中：UTC 14:30 - 21:00，盘后：UTC 21:00 - 01:00
-            market_open_utc = now_utc.replace(hour=14, minute=30, second=0, microsecond=0)
-            market_close_utc = now_utc.replace(hour=21, minute=0, second=0, microsecond=0)
-            pre_market_open_utc = now_utc.replace(hour=9, minute=0, second=0, microsecond=0)
-            post_market_close_utc = now_utc.replace(hour=1, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        if now_utc is None:
+            now_utc = datetime.utcnow()
         
         # 检查是否在周一到周五
         if now_utc.weekday() >= 5:
             return False
         
-        # 检查是否在交易时段内
-        return (pre_market_open_utc <= now_utc < market_open_utc) or \
-               (market_open_utc <= now_utc < market_close_utc) or \
-               (market_close_utc <= now_utc < post_market_close_utc)
+        # 盘前、盘中、盘后三个时段首尾相接，只需判断是否在盘前开始和盘后结束之间
+        pre_market_open_utc, _, _, post_market_close_utc = market_windows_for_date(now_utc.date())
+        return pre_market_open_utc <= now_utc < post_market_close_utc
     
     def _run_fluctuation_monitoring(self):
         """波动监控主循环"""
@@ -132,21 +119,33 @@ class MultiUserMonitorManager:
         
         while self._running:
             try:
-                if not self._is_us_market_open_or_pre_post():
-                    logging.debug("当前不在美股交易时段，波动监控暂停")
-                    time.sleep(60)
+                # 每轮只读取一次时钟，时段判断和休市等待使用同一时间
+                now_utc = datetime.utcnow()
+                if not self._is_us_market_open_or_pre_post(now_utc):
+                    # 休市期间直接等到下一个交易日盘前开始
+                    next_open = next_eastern_time(now_utc, (4, 0))
+                    logging.debug(f"当前不在美股交易时段，波动监控暂停至 {next_open.isoformat(timespec='minutes')} UTC")
+                    self._wait_until(next_open)
                     continue
                 
                 if not self.fluctuation_monitors:
                     logging.debug("没有启用波动监控的用户")
-                    time.sleep(60)
+                    self._wait_for_next_minute()
                     continue
                 
+                # 本轮采样统一使用整分钟调度时刻，避免唤醒误差和预取耗时使相邻采样间隔不足 1 分钟
+                tick = minute_tick(datetime.now())
+                
+                # 一次批量请求预取所有用户监控股票的实时价格，各监控器随后直接命中价格缓存
+                symbols = {symbol for monitor in self.fluctuation_monitors.values()
+                           for symbol in monitor.user_config.fluctuation.symbols}
+                get_current_prices(list(symbols))
+                
                 # 使用线程池并发执行所有用户的波动监控
                 with ThreadPoolExecutor(max_workers=5) as executor:
                     futures = []
                     for email, monitor in self.fluctuation_monitors.items():
-                        future = executor.submit(monitor.run_once)
+                        future = executor.submit(monitor.run_once, tick)
                         futures.append((email, future))
                     
                     # 收集结果
@@ -159,13 +158,13 @@ class MultiUserMonitorManager:
                             logging.error(f"用户 {email} 波动监控执行失败: {e}")
                     
                     if notification_count > 0:
-                        logging.info(f"本轮波动监控发送了 {notification_count} 个通知")
+                        logging.info(f"本轮波动监控有 {notification_count} 个用户触发提醒")
                 
-                time.sleep(60)  # 每分钟执行一次
+                self._wait_for_next_minute()  # 对齐到整分钟执行，避免间隔逐轮漂移
                 
             except Exception as e:
                 logging.error(f"波动监控线程异常: {e}")
-                time.sleep(60)
+                self._wait_for_next_minute()
     
     def _run_trend_monitoring(self):
         """趋势监控主循环"""
@@ -175,7 +174,7 @@ class MultiUserMonitorManager:
             try:
                 if not self.trend_monitors:
                     logging.debug("没有启用趋势监控的用户")
-                    time.sleep(1800)  # 30分钟后再检查
+                    self._wait_for_next_trend_run()
                     continue
                 
                 # 使用线程池并发执行所有用户的趋势监控
@@ -197,11 +196,24 @@ class MultiUserMonitorManager:
                     if notification_count > 0:
                         logging.info(f"本轮趋势监控发送了 {notification_count} 个通知")
                 
-                time.sleep(1800)  # 每30分钟检查一次
+                # 趋势分析只在盘前、盘后固定时刻执行，直接等到下一个执行时刻
+                self._wait_for_next_trend_run()
                 
             except Exception as e:
                 logging.error(f"趋势监控线程异常: {e}")
-                time.sleep(1800)
+                self._wait_for_next_trend_run()
+    
+    def _wait_until(self, target_utc: datetime):
+        """等待到指定 UTC 时间，stop() 时立即返回"""
+        self._stop_event.wait(max((target_utc - datetime.utcnow()).total_seconds(), 0))
+    
+    def _wait_for_next_minute(self):
+        """等待到下一个整分钟"""
+        self._stop_event.wait(60 - time.time() % 60)
+    
+    def _wait_for_next_trend_run(self):
+        """等待到下一个趋势分析时刻（美东时间 9:00 盘前、17:00 盘后）"""
+        self._wait_until(next_eastern_time(datetime.utcnow(), (9, 0), (17, 0)))
     
     def start(self):
         """启动多用户监控"""
@@ -210,6 +222,7 @@ class MultiUserMonitorManager:
             return
         
         self._running = True
+        self._stop_event.clear()
         
         # 启动波动监控线程
         self._fluctuation_thread = threading.Thread(
@@ -235,6 +248,7 @@ class MultiUserMonitorManager:
             return
         
         self._running = False
+        self._stop_event.set()
         
         # 等待线程结束
         if self._fluctuation_thread and self._fluctuation_thread.is_alive():
@@ -243,6 +257,9 @@ class MultiUserMonitorManager:
         if self._trend_thread and self._trend_thread.is_alive():
             self._trend_thread.join(timeout=5)
         
+        # 限时发送合并窗口内尚未发出的波动提醒，SMTP 无响应时不阻塞停止
+        flush_notifiers([monitor.notifier for monitor in list(self.fluctuation_monitors.values())])
+        
         logging.info("多用户监控已停止")
     
     def get_status(self) -> Dict:
@@ -1,54 +1,50 @@
+import atexit
+import logging
 import smtplib
+import threading
+import time
+import weakref
 from email.mime.text import MIMEText
 from email.utils import formataddr
-from typing import List, Tuple, Dict, Optional
+from functools import lru_cache
+from typing import Callable, List, Tuple, Dict, Optional
 
 from email.mime.multipart import MIMEMultipart
 from src.indicators.trend import TrendAnalysisResult
 from src.indicators.fluctuation import FluctuationAnalysisResult
 
+# 复用的 SMTP 连接，避免每封邮件都重新进行 TLS 握手和登录
+SMTP_IDLE_CHECK_SECONDS = 60  # 空闲超过该时间后复用前先发送 NOOP 检查连接
+MAX_RECIPIENTS_PER_MESSAGE = 100  # Gmail 单封邮件的收件人上限
+MAX_MESSAGES_PER_CONNECTION = 100  # 单个连接发送该数量的邮件后重新连接，避免触发服务器限制
+SMTP_TIMEOUT_SECONDS = 30  # 连接和每次读写的超时，避免服务器无响应时一直占用发送锁
 
-def build_trend_email_content(
-    trends: Dict[str, TrendAnalysisResult],
-    changes: Dict[str, Tuple[str, str]]
-) -> str:
-    """
-    构建 HTML 邮件内容，展示股票趋势和技术指标。
-    """
+_smtp_conn: Optional[smtplib.SMTP_SSL] = None
+_smtp_key: Optional[Tuple[str, int, str]] = None  # (服务器, 端口, 账号)
+_smtp_last_used = 0.0
+_smtp_sent = 0  # 当前连接已发送的邮件数
+_smtp_lock = threading.Lock()
 
-    def color_for_trend(_trend: str) -> str:
-        return {
-            'up': 'green',
-            'down': 'red',
-            'flat': 'gray',
-            'unknown': 'black'
-        }.get(_trend, 'black')
+# 进程退出时发送未发出提醒的最长等待时间（秒），超时后放弃，不阻塞退出
+SHUTDOWN_FLUSH_TIMEOUT_SECONDS = 10
 
-    def color_for_signal(_signal: str) -> str:
-        return {
-            'buy': 'green',
-            'sell': 'red',
-            'hold': 'gray'
-        }.get(_signal, 'black')
 
-    def color_for_close_price(close_price: float, bb_upper: float, bb_lower: float) -> str:
-        """
-        根据收盘价的位置设置颜色：
-        - 上轨：绿色
-        - 下轨：红色
-        - 中轨：黄色
-        - 上下轨之间：蓝色
-        """
-        if close_price > bb_upper:
-            return 'green'
-        elif close_price < bb_lower:
-            return 'red'
-        elif close_price == (bb_upper + bb_lower) / 2:
-            return 'yellow'
-        else:
-            return 'blue'
+# 趋势和策略建议对应的显示颜色
+_TREND_COLOR = {
+    'up': 'green',
+    'down': 'red',
+    'flat': 'gray',
+    'unknown': 'black'
+}
+
+_SIGNAL_COLOR = {
+    'buy': 'green',
+    'sell': 'red',
+    'hold': 'gray'
+}
 
-    html = """<html><body>
+# 趋势日报的 HTML 模板，表头和表尾固定，每支股票按行模板格式化
+_TREND_HEADER = """<html><body>
         <h2>📈 股票趋势日报</h2>
         <table border="1" cellspacing="0" cellpadding="6" style="border-collapse: collapse;">
         <tr>
@@ -65,56 +61,28 @@ def build_trend_email_content(
         </tr>
     """
 
-    sorted_symbols = sorted(trends.keys(), key=lambda sym: sym in changes, reverse=True)
-
-    for symbol in sorted_symbols:
-        result = trends[symbol]
-        indicator = result.indicators
-        current_trend = getattr(result, 'current_trend', result.trends[-1] if result.trends else "unknown")
-        signal = result.signal or "hold"
-        signal_color = color_for_signal(signal)
-        trend_color = color_for_trend(current_trend)
-
-        change_info = ""
-        if symbol in changes:
-            prev, curr = changes[symbol]
-            change_info = f"{prev} → <b style='color:{trend_color}'>{curr}</b>"
-
-        close_price_color = color_for_close_price(
-            indicator.close, indicator.bb_upper, indicator.bb_lower
-        )
-
-        html += f"""<tr>
+_TREND_ROW_TEMPLATE = """<tr>
             <td>{symbol}</td>
             <td style="color:{trend_color}"><b>{current_trend}</b></td>
             <td>{change_info}</td>
-            <td style="color:{signal_color}"><b>{signal.upper()}</b></td>
-            <td>{'在上方' if indicator.ema7 > indicator.ema20 else '在下方'}</td>
-            <td>{"MACD柱>0 且 DIF>DEA" if indicator.macd_hist > 0 and indicator.macd > indicator.macd_signal else "弱势"}</td>
-            <td>{indicator.adx:.2f}</td>
+            <td style="color:{signal_color}"><b>{signal}</b></td>
+            <td>{ema_state}</td>
+            <td>{macd_state}</td>
+            <td>{ind.adx:.2f}</td>
             <td>
-                中轨: {indicator.bb_middle:.2f}<br>
-                上轨: {indicator.bb_upper:.2f}<br>
-                下轨: {indicator.bb_lower:.2f}
+                中轨: {ind.bb_middle:.2f}<br>
+                上轨: {ind.bb_upper:.2f}<br>
+                下轨: {ind.bb_lower:.2f}
             </td>
-            <td>{indicator.rsi:.2f}</td>
-            <td style="color:{close_price_color};"><b>{indicator.close:.2f}</b></td>
+            <td>{ind.rsi:.2f}</td>
+            <td style="color:{close_color};"><b>{ind.close:.2f}</b></td>
         </tr>"""
 
-    html += "</table></body></html>"
-    return html
+_TREND_FOOTER = "</table></body></html>"
 
-def build_fluctuation_email_content(
-    results: List[FluctuationAnalysisResult] # Step 2: Accept a list of results
-) -> str:
-    """
-    构建 HTML 邮件内容，展示股票价格波动信息。
-    :param results: FluctuationAnalysisResult 对象的列表
-    """
-    if not results:
-        return "<html><body><p>没有股票波动信息。</p></body></html>"
 
-    html = """<html><body>
+# 波动提醒的 HTML 模板，表头和表尾固定，每条提醒按行模板格式化
+_FLUCT_HEADER = """<html><body>
         <h2>🚨 股票价格波动提醒</h2>
         <table border="1" cellspacing="0" cellpadding="6" style="border-collapse: collapse;">
         <tr>
@@ -126,9 +94,7 @@ def build_fluctuation_email_content(
         </tr>
     """
 
-    for result in results: # Step 2: Iterate through the list
-        color = "green" if result.change_type == "上涨" else "red"
-        html += f"""
+_FLUCT_ROW_TEMPLATE = """
         <tr>
             <td><b>{result.symbol}</b></td>
             <td>${result.initial_price:.2f}</td>
@@ -137,11 +103,91 @@ def build_fluctuation_email_content(
             <td style='color:{color}'>{result.percentage_change:.2f}%</td>
         </tr>
         """
-    html += """</table>
+
+_FLUCT_FOOTER = """</table>
         <p>请注意市场动态。</p>
         </body></html>
     """
-    return html
+
+def _close_price_color(close_price: float, bb_upper: float, bb_lower: float) -> str:
+    """
+    根据收盘价的位置设置颜色：
+    - 上轨：绿色
+    - 下轨：红色
+    - 中轨：黄色
+    - 上下轨之间：蓝色
+    """
+    if close_price > bb_upper:
+        return 'green'
+    elif close_price < bb_lower:
+        return 'red'
+    elif close_price == (bb_upper + bb_lower) / 2:
+        return 'yellow'
+    else:
+        return 'blue'
+
+
+def build_trend_email_content(
+    trends: Dict[str, TrendAnalysisResult],
+    changes: Dict[str, Tuple[str, str]]
+) -> str:
+    """
+    构建 HTML 邮件内容，展示股票趋势和技术指标。
+    """
+    # 有趋势变化的股票排在前面，组内保持原有顺序
+    sorted_symbols = [sym for sym in trends if sym in changes] + [sym for sym in trends if sym not in changes]
+
+    rows = [_TREND_HEADER]
+    for symbol in sorted_symbols:
+        result = trends[symbol]
+        indicator = result.indicators
+        current_trend = getattr(result, 'current_trend', result.trends[-1] if result.trends else "unknown")
+        signal = result.signal or "hold"
+        trend_color = _TREND_COLOR.get(current_trend, 'black')
+
+        change_info = ""
+        if symbol in changes:
+            prev, curr = changes[symbol]
+            change_info = f"{prev} → <b style='color:{trend_color}'>{curr}</b>"
+
+        rows.append(_TREND_ROW_TEMPLATE.format(
+            symbol=symbol,
+            trend_color=trend_color,
+            current_trend=current_trend,
+            change_info=change_info,
+            signal_color=_SIGNAL_COLOR.get(signal, 'black'),
+            signal=signal.upper(),
+            ema_state='在上方' if indicator.ema7 > indicator.ema20 else '在下方',
+            macd_state="MACD柱>0 且 DIF>DEA" if indicator.macd_hist > 0 and indicator.macd > indicator.macd_signal else "弱势",
+            ind=indicator,
+            close_color=_close_price_color(indicator.close, indicator.bb_upper, indicator.bb_lower),
+        ))
+
+    rows.append(_TREND_FOOTER)
+    return "".join(rows)
+
+def build_fluctuation_email_content(
+    results: List[FluctuationAnalysisResult] # Step 2: Accept a list of results
+) -> str:
+    """
+    构建 HTML 邮件内容，展示股票价格波动信息。
+    :param results: FluctuationAnalysisResult 对象的列表
+    """
+    if not results:
+        return "<html><body><p>没有股票波动信息。</p></body></html>"
+
+    rows = [_FLUCT_HEADER]
+    for result in results: # Step 2: Iterate through the list
+        color = "green" if result.change_type == "上涨" else "red"
+        rows.append(_FLUCT_ROW_TEMPLATE.format(result=result, color=color))
+    rows.append(_FLUCT_FOOTER)
+    return "".join(rows)
+
+@lru_cache(maxsize=16)
+def _format_sender(sender_name: str, smtp_user: str) -> str:
+    """发件人地址头，发送者配置基本不变，按 (名称, 邮箱) 缓存"""
+    return formataddr((sender_name, smtp_user))
+
 
 def send_gmail(
     subject: str, 
@@ -166,19 +212,199 @@ def send_gmail(
         smtp_pass: 邮箱密码
         sender_name: 发送者名称
     """
+    global _smtp_last_used, _smtp_sent
     if not smtp_user or not smtp_pass:
         raise ValueError("发送邮箱账号和密码不能为空")
     
     msg = MIMEText(html_body, 'html')
     msg['Subject'] = subject
-    msg['From'] = formataddr((sender_name, smtp_user))
-    msg['To'] = ', '.join(to_emails)
+    sender = _format_sender(sender_name, smtp_user)
+    msg['From'] = sender
+    if len(to_emails) == 1:
+        msg['To'] = to_emails[0]
+    else:
+        # 多个收件人时以密送方式发送，To 头只写发件人，避免暴露彼此的地址
+        msg['To'] = sender
+    # 在获取 SMTP 连接前序列化为字节，分批投递时 sendmail 不再重复编码
+    payload = msg.as_bytes()
 
     try:
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(smtp_user, to_emails, msg.as_string())
+        with _smtp_lock:
+            # 同一连接内按单封邮件的收件人上限分批投递
+            for i in range(0, len(to_emails), MAX_RECIPIENTS_PER_MESSAGE):
+                recipients = to_emails[i:i + MAX_RECIPIENTS_PER_MESSAGE]
+                for attempt in range(2):
+                    conn = _get_smtp(smtp_server, smtp_port, smtp_user, smtp_pass)
+                    try:
+                        conn.sendmail(smtp_user, recipients, payload)
+                        _smtp_sent += 1
+                        break
+                    except (smtplib.SMTPServerDisconnected, ConnectionError):
+                        # 缓存的连接已被服务器关闭，丢弃后重连重试一次
+                        _close_smtp()
+                        if attempt:
+                            raise
+                    except smtplib.SMTPException:
+                        raise
+                    except OSError:
+                        # 超时等网络错误：直接关闭连接，不再发送 QUIT 等待无响应的服务器
+                        _close_smtp(graceful=False)
+                        raise
+            _smtp_last_used = time.monotonic()
         print(f"[SUCCESS] 邮件发送成功 ✅ -> {', '.join(to_emails)}")
     except Exception as e:
         print(f"[ERROR] 邮件发送失败 ❌: {str(e)}")
         raise  # 重新抛出异常以便上层处理
+
+
+def _get_smtp(smtp_server: str, smtp_port: int, smtp_user: str, smtp_pass: str) -> smtplib.SMTP_SSL:
+    """
+    返回已登录的 SMTP 连接，调用方需持有 _smtp_lock
+    服务器配置变化、连接失效或已发送邮件数达到上限时重新建立连接
+    """
+    global _smtp_conn, _smtp_key
+    key = (smtp_server, smtp_port, smtp_user)
+    if _smtp_conn is not None and _smtp_key == key and _smtp_sent < MAX_MESSAGES_PER_CONNECTION:
+        if time.monotonic() - _smtp_last_used < SMTP_IDLE_CHECK_SECONDS:
+            return _smtp_conn
+        try:
+            if _smtp_conn.noop()[0] == 250:
+                return _smtp_conn
+        except (smtplib.SMTPException, OSError):
+            # NOOP 失败说明连接已不可用，直接关闭
+            _close_smtp(graceful=False)
+    _close_smtp()
+
+    conn = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
+    try:
+        conn.login(smtp_user, smtp_pass)
+    except Exception:
+        conn.close()
+        raise
+    _smtp_conn, _smtp_key = conn, key
+    return conn
+
+
+def _close_smtp(graceful: bool = True):
+    """
+    关闭并丢弃缓存的 SMTP 连接，调用方需持有 _smtp_lock
+    graceful 为 False 时不发送 QUIT，直接关闭套接字
+    """
+    global _smtp_conn, _smtp_key, _smtp_sent
+    if _smtp_conn is not None:
+        try:
+            if graceful:
+                _smtp_conn.quit()
+            else:
+                _smtp_conn.close()
+        except (smtplib.SMTPException, OSError):
+            _smtp_conn.close()
+    _smtp_conn, _smtp_key = None, None
+    _smtp_sent = 0
+
+
+class BatchingNotifier:
+    """
+    按时间窗口合并波动提醒
+    第一条提醒到达时开始计时，窗口结束时把期间收集的提醒一次交给 send_func 发送；
+    同一股票同一方向的提醒在窗口内只保留最新一条。窗口为 0 时每次加入都立即发送
+    """
+
+    def __init__(self, send_func: Callable[[List[FluctuationAnalysisResult]], bool],
+                 window_seconds: float = 0):
+        self._send_func = send_func
+        self._window_seconds = window_seconds
+        self._pending: Dict[Tuple[str, str], FluctuationAnalysisResult] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        _notifiers.add(self)
+
+    def add(self, results: List[FluctuationAnalysisResult]):
+        """加入待发送的提醒，窗口为 0 时立即发送"""
+        if not results:
+            return
+        with self._lock:
+            for result in results:
+                self._pending[(result.symbol, result.change_type)] = result
+            if self._window_seconds <= 0:
+                start_timer = False
+            elif self._timer is None:
+                self._timer = threading.Timer(self._window_seconds, self.flush)
+                self._timer.daemon = True
+                start_timer = True
+            else:
+                return
+        if start_timer:
+            self._timer.start()
+        else:
+            self.flush()
+
+    def flush(self) -> bool:
+        """立即发送所有待发送的提醒"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return False
+        try:
+            return self._send_func(pending)
+        except Exception as e:
+            logging.error(f"发送合并提醒失败: {e}")
+            return False
+
+    def discard(self) -> int:
+        """丢弃所有待发送的提醒并取消计时，用于监控器停用或移除，返回丢弃的数量"""
+        with self._lock:
+            count = len(self._pending)
+            self._pending.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return count
+
+    @property
+    def pending_count(self) -> int:
+        """等待发送的提醒数量"""
+        with self._lock:
+            return len(self._pending)
+
+
+_notifiers: "weakref.WeakSet[BatchingNotifier]" = weakref.WeakSet()
+
+
+def flush_notifiers(notifiers: List[BatchingNotifier],
+                    timeout: float = SHUTDOWN_FLUSH_TIMEOUT_SECONDS) -> bool:
+    """
+    在后台线程中发送各合并器未发出的提醒，最多等待 timeout 秒
+    返回是否在时限内发送完成；超时的发送线程为守护线程，不阻塞进程退出
+    """
+    notifiers = [n for n in notifiers if n.pending_count]
+    if not notifiers:
+        return True
+
+    def flush():
+        for notifier in notifiers:
+            notifier.flush()
+
+    thread = threading.Thread(target=flush, name="notifier-flush", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        logging.warning(f"{timeout} 秒内未能发送完待发送的提醒，放弃发送")
+        return False
+    return True
+
+
+@atexit.register
+def _flush_all_notifiers():
+    """进程退出时限时发送所有未发出的提醒，然后关闭复用的 SMTP 连接"""
+    if not flush_notifiers(list(_notifiers)):
+        return
+    if _smtp_lock.acquire(timeout=1):
+        try:
+            _close_smtp()
+        finally:
+            _smtp_lock.release()
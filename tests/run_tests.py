@@ -79,7 +79,7 @@ def check_dependencies():
     
     required_packages = [
         "yaml", "fastapi", "uvicorn", "pandas", "numpy", 
-        "yfinance", "pandas_ta", "requests"
+        "yfinance", "numba", "requests"
     ]
     
     missing_packages = []
@@ -176,6 +176,63 @@ class TestConfigManager(unittest.TestCase):
         self.assertIsNotNone(user_config)
         self.assertEqual(user_config.name, "Persistent User")
 
+    def test_user_indexes(self):
+        """测试启用用户和股票代码索引随用户变更更新"""
+        self.config_manager.create_or_update_user(
+            email="a@example.com",
+            fluctuation_symbols=["AAPL", "TSLA"],
+            trend_symbols=["AAPL", "TOP_NASDAQ"]
+        )
+        self.config_manager.create_or_update_user(
+            email="b@example.com",
+            fluctuation_symbols=["AAPL"],
+            fluctuation_enabled=False,
+            trend_symbols=["NVDA"]
+        )
+
+        self.assertEqual(set(self.config_manager.get_fluctuation_enabled_users()), {"a@example.com"})
+        self.assertEqual(set(self.config_manager.get_trend_enabled_users()), {"a@example.com", "b@example.com"})
+        self.assertEqual(self.config_manager.get_all_monitored_symbols(), {"AAPL", "TSLA", "NVDA"})
+        self.assertEqual(
+            [u.email for u in self.config_manager.get_users_for_symbol("AAPL")], ["a@example.com"]
+        )
+        self.assertEqual(
+            [u.email for u in self.config_manager.get_users_for_symbol("NVDA", "trend")], ["b@example.com"]
+        )
+
+        self.config_manager.delete_user("a@example.com")
+        self.assertEqual(self.config_manager.get_users_for_symbol("AAPL"), [])
+        self.assertEqual(self.config_manager.get_all_monitored_symbols(), {"NVDA"})
+
+    def test_reload_skips_unchanged_file(self):
+        """测试配置文件未变化时跳过重新解析"""
+        self.config_manager.create_or_update_user(email="cached@example.com", name="Cached")
+        self.assertTrue(self.config_manager.load_users_config())
+
+        with patch('src.config.config_manager.yaml.load') as mock_load:
+            self.assertTrue(self.config_manager.load_users_config())
+            mock_load.assert_not_called()
+
+        self.assertIsNotNone(self.config_manager.get_user_config("cached@example.com"))
+
+    def test_analysis_config_round_trip(self):
+        """测试与系统默认值相同的用户趋势配置在加载、保存后仍然保留"""
+        email = "override@example.com"
+        self.config_manager.create_or_update_user(email=email, name="Override")
+        self.config_manager.users[email].trend.analysis_config = TrendAnalysisConfig()
+        self.assertTrue(self.config_manager.save_users_config())
+
+        self.config_manager._users_sig = None
+        self.assertTrue(self.config_manager.load_users_config())
+        loaded = self.config_manager.get_user_config(email).trend.analysis_config
+        self.assertIsNotNone(loaded)
+        self.assertEqual(loaded, self.config_manager.system_config.trend_analysis)
+
+        self.assertTrue(self.config_manager.save_users_config())
+        with open(self.users_config_file, encoding='utf-8') as f:
+            saved = yaml.safe_load(f)
+        self.assertIn('analysis_config', saved[email]['trend'])
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
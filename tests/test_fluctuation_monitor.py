@@ -2,6 +2,8 @@
 波动监控器测试
 """
 
+import socket
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
@@ -12,8 +14,11 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.monitors.fluctuation_monitor import FluctuationMonitor
+from src.monitors.market_clock import minute_tick
 from src.config.config_manager import UserConfig, UserFluctuationConfig
-from src.indicators.fluctuation import FluctuationAnalysisResult
+from src.indicators.fluctuation import FluctuationAnalysisResult, FluctuationAnalyzer, PriceHistory
+from src.notifiers import email as email_notifier
+from src.notifiers.email import BatchingNotifier
 
 
 class TestFluctuationMonitor(unittest.TestCase):
@@ -129,6 +134,137 @@ class TestFluctuationMonitor(unittest.TestCase):
         self.assertTrue(success or True)  # send_gmail可能抛出异常，但测试结构正确
         mock_send_email.assert_called_once()
     
+    @patch('src.monitors.fluctuation_monitor.get_current_price')
+    def test_jittered_ticks_compare_consecutive_minutes(self, mock_get_price):
+        """测试唤醒时间有抖动时，每轮仍与上一分钟的采样比较"""
+        wake_times = [
+            datetime(2025, 7, 1, 14, 0, 2),
+            datetime(2025, 7, 1, 14, 1, 0, 500000),
+            datetime(2025, 7, 1, 14, 2, 1, 500000),
+            datetime(2025, 7, 1, 14, 2, 59, 999000),  # 提前几毫秒被唤醒
+        ]
+        prices = [100.0, 101.0, 102.0, 106.0]
+        analyzed = []
+        original = FluctuationAnalyzer.analyze_fluctuation
+
+        def spy(**kwargs):
+            result = original(**kwargs)
+            analyzed.append(result and result.initial_price)
+            return result
+
+        with patch('src.monitors.fluctuation_monitor.FluctuationAnalyzer.analyze_fluctuation', side_effect=spy):
+            for wake, price in zip(wake_times, prices):
+                mock_get_price.return_value = price
+                results = self.monitor.check_fluctuations(now=minute_tick(wake))
+
+        self.assertEqual(analyzed, [None, 100.0, 101.0, 102.0])
+        self.assertEqual([(r.symbol, r.initial_price, r.current_price) for r in results], [("AAPL", 102.0, 106.0)])
+    
+    def test_price_history_ring_buffer(self):
+        """测试价格环形缓冲区写满后覆盖最旧采样，并能找到窗口起点价格"""
+        start = datetime(2025, 7, 1, 10, 0)
+        history = PriceHistory(maxlen=5)
+        for i in range(8):
+            history.append((start + timedelta(minutes=i), 100.0 + i))
+
+        self.assertEqual(len(history), 5)
+        self.assertEqual([price for _, price in history], [103.0, 104.0, 105.0, 106.0, 107.0])
+        self.assertEqual(next(reversed(history)), (start + timedelta(minutes=7), 107.0))
+        self.assertEqual(history.latest_at_or_before(start + timedelta(minutes=5, seconds=30)),
+                         (start + timedelta(minutes=5), 105.0))
+        self.assertIsNone(history.latest_at_or_before(start + timedelta(minutes=2)))
+
+        # 与 deque 的分析结果一致
+        now = start + timedelta(minutes=7, seconds=10)
+        expected = FluctuationAnalyzer.analyze_fluctuation("AAPL", deque(history), 110.0, 2, now=now)
+        result = FluctuationAnalyzer.analyze_fluctuation("AAPL", history, 110.0, 2, now=now)
+        self.assertEqual(result, expected)
+        self.assertEqual(result.initial_price, 105.0)
+    
+    def test_batching_notifier(self):
+        """测试合并窗口内的提醒合并为一次发送"""
+        send_func = MagicMock(return_value=True)
+        notifier = BatchingNotifier(send_func, window_seconds=60)
+
+        def result(symbol, change):
+            return FluctuationAnalysisResult(
+                symbol=symbol,
+                initial_price=100.0,
+                current_price=100.0 + change,
+                percentage_change=change,
+                change_type="上涨" if change > 0 else "下跌"
+            )
+
+        notifier.add([result("AAPL", 3.5)])
+        notifier.add([result("AAPL", 4.0), result("MSFT", -3.2)])
+
+        # 窗口结束前不发送，同一股票同一方向只保留最新一条
+        send_func.assert_not_called()
+        self.assertEqual(notifier.pending_count, 2)
+
+        self.assertTrue(notifier.flush())
+        send_func.assert_called_once()
+        sent = send_func.call_args[0][0]
+        self.assertEqual([(r.symbol, r.percentage_change) for r in sent], [("AAPL", 4.0), ("MSFT", -3.2)])
+        self.assertEqual(notifier.pending_count, 0)
+        self.assertFalse(notifier.flush())
+
+        # 丢弃待发送的提醒后不再发送
+        notifier.add([result("NVDA", 5.0)])
+        self.assertEqual(notifier.discard(), 1)
+        self.assertFalse(notifier.flush())
+        send_func.assert_called_once()
+
+        # 窗口为 0 时立即发送
+        immediate = BatchingNotifier(send_func, window_seconds=0)
+        immediate.add([result("TSLA", -4.0)])
+        self.assertEqual(send_func.call_count, 2)
+        self.assertEqual(immediate.pending_count, 0)
+
+    def test_flush_notifiers_timeout(self):
+        """测试限时发送：发送阻塞时在超时后返回，不阻塞调用方"""
+        release = threading.Event()
+        notifier = BatchingNotifier(lambda results: release.wait(5), window_seconds=60)
+        notifier.add([FluctuationAnalysisResult("AAPL", 100.0, 105.0, 5.0, "上涨")])
+
+        try:
+            self.assertFalse(email_notifier.flush_notifiers([notifier], timeout=0.1))
+        finally:
+            release.set()
+        self.assertTrue(email_notifier.flush_notifiers([notifier], timeout=0.1))
+    
+    def test_smtp_connection_reuse(self):
+        """测试多封邮件复用同一 SMTP 连接，达到单连接发送上限后重新连接"""
+        with patch('src.notifiers.email.smtplib.SMTP_SSL') as mock_smtp, \
+                patch.object(email_notifier, 'MAX_MESSAGES_PER_CONNECTION', 2):
+            with email_notifier._smtp_lock:
+                email_notifier._close_smtp()
+            for _ in range(3):
+                email_notifier.send_gmail("主题", "<p>内容</p>", ["to@example.com"],
+                                          smtp_user="from@example.com", smtp_pass="secret")
+            with email_notifier._smtp_lock:
+                email_notifier._close_smtp()
+
+        self.assertEqual(mock_smtp.call_count, 2)
+        conn = mock_smtp.return_value
+        self.assertEqual(conn.login.call_count, 2)
+        self.assertEqual(conn.sendmail.call_count, 3)
+    
+    def test_smtp_timeout_drops_connection(self):
+        """测试 SMTP 超时后丢弃连接并释放发送锁"""
+        with patch('src.notifiers.email.smtplib.SMTP_SSL') as mock_smtp:
+            conn = mock_smtp.return_value
+            conn.sendmail.side_effect = socket.timeout("timed out")
+            with self.assertRaises(OSError):
+                email_notifier.send_gmail("主题", "<p>内容</p>", ["to@example.com"],
+                                          smtp_user="from@example.com", smtp_pass="secret")
+
+        self.assertEqual(mock_smtp.call_args.kwargs["timeout"], email_notifier.SMTP_TIMEOUT_SECONDS)
+        conn.close.assert_called_once()
+        conn.quit.assert_not_called()
+        self.assertIsNone(email_notifier._smtp_conn)
+        self.assertFalse(email_notifier._smtp_lock.locked())
+    
     def test_update_config(self):
         """测试配置更新"""
         # 创建新配置
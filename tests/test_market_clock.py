@@ -0,0 +1,58 @@
+"""
+美股交易时钟测试
+"""
+
+import unittest
+from datetime import date, datetime
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.monitors.market_clock import us_eastern_offset_hours, market_windows_for_date, minute_tick, next_eastern_time
+
+
+class TestMarketClock(unittest.TestCase):
+
+    def test_offset_follows_dst_transitions(self):
+        """测试时差按实际夏令时切换日期变化，而不是按月份粗略判断"""
+        # 2025 年夏令时：3 月 9 日开始，11 月 2 日结束
+        self.assertEqual(us_eastern_offset_hours(date(2025, 3, 7)), 5)
+        self.assertEqual(us_eastern_offset_hours(date(2025, 3, 10)), 4)
+        self.assertEqual(us_eastern_offset_hours(date(2025, 10, 31)), 4)
+        self.assertEqual(us_eastern_offset_hours(date(2025, 11, 3)), 5)
+
+    def test_market_windows(self):
+        """测试各交易时段的 UTC 时间"""
+        self.assertEqual(
+            market_windows_for_date(date(2025, 7, 1)),
+            (datetime(2025, 7, 1, 8, 0), datetime(2025, 7, 1, 13, 30),
+             datetime(2025, 7, 1, 20, 0), datetime(2025, 7, 2, 0, 0))
+        )
+        self.assertEqual(
+            market_windows_for_date(date(2025, 12, 1)),
+            (datetime(2025, 12, 1, 9, 0), datetime(2025, 12, 1, 14, 30),
+             datetime(2025, 12, 1, 21, 0), datetime(2025, 12, 2, 1, 0))
+        )
+
+    def test_next_eastern_time(self):
+        """测试下一个工作日美东时刻的计算"""
+        # 周三 UTC 12:00（美东 8:00）-> 当天美东 9:00
+        self.assertEqual(next_eastern_time(datetime(2025, 7, 2, 12, 0), (9, 0), (17, 0)),
+                         datetime(2025, 7, 2, 13, 0))
+        # 周五 UTC 23:00（美东 19:00）-> 下周一美东 9:00
+        self.assertEqual(next_eastern_time(datetime(2025, 7, 4, 23, 0), (9, 0), (17, 0)),
+                         datetime(2025, 7, 7, 13, 0))
+        # 周二 UTC 00:30 仍是美东周一晚上 -> 周二美东 4:00（冬令时）
+        self.assertEqual(next_eastern_time(datetime(2025, 12, 2, 0, 30), (4, 0)),
+                         datetime(2025, 12, 2, 9, 0))
+
+    def test_minute_tick(self):
+        """测试采样时刻归到所在轮次的整分钟"""
+        self.assertEqual(minute_tick(datetime(2025, 7, 1, 14, 0, 40)), datetime(2025, 7, 1, 14, 0))
+        self.assertEqual(minute_tick(datetime(2025, 7, 1, 14, 1, 0, 500000)), datetime(2025, 7, 1, 14, 1))
+        self.assertEqual(minute_tick(datetime(2025, 7, 1, 14, 1, 59, 999000)), datetime(2025, 7, 1, 14, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
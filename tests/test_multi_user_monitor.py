@@ -0,0 +1,71 @@
+"""
+多用户监控管理器测试
+"""
+
+import unittest
+import tempfile
+import os
+import shutil
+from unittest.mock import patch
+
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.config.config_manager import MultiUserConfigManager
+from src.monitors.fluctuation_monitor import FluctuationMonitor
+from src.monitors.trend_monitor import TrendMonitor
+from src.multi_user_monitor import MultiUserMonitorManager
+
+
+class TestMultiUserMonitorManager(unittest.TestCase):
+
+    def setUp(self):
+        """测试前设置"""
+        self.test_dir = tempfile.mkdtemp()
+        self.config_manager = MultiUserConfigManager(
+            config_file=os.path.join(self.test_dir, "test_users_config.yaml"),
+            system_config_file=os.path.join(self.test_dir, "test_system_config.yaml")
+        )
+        for email in ("a@example.com", "b@example.com"):
+            self.config_manager.create_or_update_user(
+                email=email, fluctuation_symbols=["AAPL"], trend_symbols=["AAPL"])
+
+        with patch('src.multi_user_monitor.config_manager', self.config_manager):
+            self.manager = MultiUserMonitorManager()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.test_dir)
+
+    def test_update_only_changed_monitors(self):
+        """测试配置管理器原地修改用户配置后，只有配置变化的用户监控器被更新"""
+        with patch.object(FluctuationMonitor, 'update_config', autospec=True) as mock_fluctuation, \
+                patch.object(TrendMonitor, 'update_config', autospec=True) as mock_trend:
+            # 保存配置会通知管理器，配置没有变化时不更新
+            self.assertTrue(self.config_manager.save_users_config())
+            mock_fluctuation.assert_not_called()
+            mock_trend.assert_not_called()
+
+            # create_or_update_user 原地修改已有用户的配置对象，保存后通知管理器
+            self.config_manager.create_or_update_user(
+                email="a@example.com", fluctuation_threshold_percent=5.0)
+
+            changed = self.config_manager.users["a@example.com"]
+            mock_fluctuation.assert_called_once_with(
+                self.manager.fluctuation_monitors["a@example.com"], changed)
+            mock_trend.assert_called_once_with(
+                self.manager.trend_monitors["a@example.com"], changed)
+
+    def test_monitor_keeps_config_copy(self):
+        """测试监控器持有配置副本，更新时能识别新增的股票"""
+        self.config_manager.create_or_update_user(
+            email="a@example.com", fluctuation_symbols=["AAPL", "MSFT"])
+
+        monitor = self.manager.fluctuation_monitors["a@example.com"]
+        self.assertEqual(monitor.user_config.fluctuation.symbols, ["AAPL", "MSFT"])
+        self.assertIn("MSFT", monitor._price_history)
+        self.assertIsNot(monitor.user_config, self.config_manager.users["a@example.com"])
+
+
+if __name__ == "__main__":
+    unittest.main()
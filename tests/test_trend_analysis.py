@@ -11,7 +11,8 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from src.indicators.trend import analyze_trend, TrendAnalysisResult
+from src.indicators.trend import analyze_trend, TrendAnalysisResult, _warmup_rows
+from src.indicators._kernels import _ema, _macd, _adx, _bbands, _rsi
 from src.config.config_manager import TrendAnalysisConfig
 
 
@@ -19,6 +20,11 @@ class TestTrendAnalysis(unittest.TestCase):
     
     def setUp(self):
         """测试前设置"""
+        # 清空历史数据缓存，避免不同用例的模拟数据相互影响
+        from src.data import yahoo
+        cache_patch = patch.dict(yahoo._hist_cache, clear=True)
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
         self.test_config = TrendAnalysisConfig(
             up_trend_threshold=2,
             down_trend_threshold=2,
@@ -55,7 +61,7 @@ class TestTrendAnalysis(unittest.TestCase):
         
         return df
     
-    @patch('src.indicators.trend.yf.Ticker')
+    @patch('src.data.yahoo.yf.Ticker')
     @patch('src.indicators.trend.get_trend_analysis_config')
     def test_analyze_trend_up(self, mock_get_config, mock_ticker):
         """测试上涨趋势分析"""
@@ -79,7 +85,7 @@ class TestTrendAnalysis(unittest.TestCase):
         up_count = result.trends.count("up")
         self.assertGreater(up_count, 0)
     
-    @patch('src.indicators.trend.yf.Ticker')
+    @patch('src.data.yahoo.yf.Ticker')
     @patch('src.indicators.trend.get_trend_analysis_config')
     def test_analyze_trend_down(self, mock_get_config, mock_ticker):
         """测试下跌趋势分析"""
@@ -98,7 +104,7 @@ class TestTrendAnalysis(unittest.TestCase):
         down_count = result.trends.count("down")
         self.assertGreater(down_count, 0)
     
-    @patch('src.indicators.trend.yf.Ticker')
+    @patch('src.data.yahoo.yf.Ticker')
     @patch('src.indicators.trend.get_trend_analysis_config')
     def test_insufficient_data(self, mock_get_config, mock_ticker):
         """测试数据不足的情况"""
@@ -117,7 +123,7 @@ class TestTrendAnalysis(unittest.TestCase):
         self.assertEqual(len(result.trends), 0)
         self.assertIsNotNone(result.error)
     
-    @patch('src.indicators.trend.yf.Ticker')
+    @patch('src.data.yahoo.yf.Ticker')
     @patch('src.indicators.trend.get_trend_analysis_config')
     def test_custom_config_parameters(self, mock_get_config, mock_ticker):
         """测试自定义配置参数"""
@@ -142,7 +148,7 @@ class TestTrendAnalysis(unittest.TestCase):
         trend_count = len([t for t in result.trends if t != "flat"])
         self.assertGreater(trend_count, 0)
     
-    @patch('src.indicators.trend.yf.Ticker')
+    @patch('src.data.yahoo.yf.Ticker')
     def test_direct_config_usage(self, mock_ticker):
         """测试直接传递配置参数"""
         mock_ticker_instance = MagicMock()
@@ -155,6 +161,108 @@ class TestTrendAnalysis(unittest.TestCase):
         self.assertIsInstance(result, TrendAnalysisResult)
         self.assertEqual(result.symbol, "AAPL")
 
+    def test_indicator_kernels(self):
+        """测试指标内核与 pandas 参考实现一致"""
+        close = self.create_test_data("up")['Close']
+        values = close.to_numpy(dtype=np.float64)
+
+        # EMA：前 n 个值的简单平均为初值
+        ema = _ema(values, 7)
+        seed = pd.concat([pd.Series([close.iloc[:7].mean()]), close.iloc[7:].reset_index(drop=True)])
+        expected = seed.ewm(span=7, adjust=False).mean().to_numpy()
+        self.assertTrue(np.isnan(ema[:6]).all())
+        np.testing.assert_allclose(ema[6:], expected)
+
+        # 布林带：总体标准差
+        upper, middle, lower = _bbands(values, 20, 2.0)
+        rolling = close.rolling(20)
+        np.testing.assert_allclose(middle[19:], rolling.mean().to_numpy()[19:])
+        np.testing.assert_allclose(upper[19:], (rolling.mean() + 2 * rolling.std(ddof=0)).to_numpy()[19:])
+
+    def test_wilder_indicators_match_pandas_ta(self):
+        """测试 RSI 和 ADX 与 pandas_ta 的计算方式一致（RMA 为 adjust=True 的 ewm）"""
+        df = self.create_test_data("up")
+        close, high, low = df['Close'], df['High'], df['Low']
+        n = 14
+
+        def rma(series):
+            return series.ewm(alpha=1.0 / n, min_periods=n).mean()
+
+        # pandas_ta.rsi
+        diff = close.diff()
+        expected_rsi = 100 * rma(diff.clip(lower=0)) / (rma(diff.clip(lower=0)) + rma(diff.clip(upper=0)).abs())
+        rsi = _rsi(close.to_numpy(dtype=np.float64), n)
+        np.testing.assert_allclose(rsi[n:], expected_rsi.to_numpy()[n:])
+        self.assertTrue(np.isnan(rsi[:n]).all())
+
+        # pandas_ta.adx
+        prev_close = close.shift(1)
+        tr = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+        tr.iloc[0] = np.nan
+        up = high - high.shift(1)
+        dn = low.shift(1) - low
+        pos = (((up > dn) & (up > 0)) * up).where(up.notna())
+        neg = (((dn > up) & (dn > 0)) * dn).where(up.notna())
+        k = 100 / rma(tr)
+        dmp = k * rma(pos)
+        dmn = k * rma(neg)
+        expected_adx = rma(100 * (dmp - dmn).abs() / (dmp + dmn))
+        adx, plus_di, minus_di = _adx(high.to_numpy(dtype=np.float64), low.to_numpy(dtype=np.float64),
+                                      close.to_numpy(dtype=np.float64), n)
+        np.testing.assert_allclose(plus_di[n:], dmp.to_numpy()[n:])
+        np.testing.assert_allclose(minus_di[n:], dmn.to_numpy()[n:])
+        np.testing.assert_allclose(adx[2 * n - 1:], expected_adx.to_numpy()[2 * n - 1:])
+        self.assertTrue(np.isnan(adx[:2 * n - 1]).all())
+
+    def test_warmup_rows(self):
+        """测试预热期长度与指标第一行全部有效的位置一致"""
+        df = self.create_test_data("up")
+        close = df['Close'].to_numpy(dtype=np.float64)
+        high = df['High'].to_numpy(dtype=np.float64)
+        low = df['Low'].to_numpy(dtype=np.float64)
+
+        for config in (TrendAnalysisConfig(), TrendAnalysisConfig(adx_period=20, macd_signal_period=5)):
+            columns = [
+                _ema(close, config.ema_short_period),
+                _ema(close, config.ema_long_period),
+                *_macd(close, config.macd_fast_period, config.macd_slow_period, config.macd_signal_period),
+                *_adx(high, low, close, config.adx_period),
+                *_bbands(close, config.bb_period, config.bb_std_dev),
+                _rsi(close, config.rsi_period),
+            ]
+            valid = ~np.isnan(np.column_stack(columns)).any(axis=1)
+            self.assertEqual(int(np.argmax(valid)), _warmup_rows(config))
+            self.assertTrue(valid[_warmup_rows(config):].all())
+
+    def test_history_batch_cache_per_symbol(self):
+        """测试批量历史数据按股票缓存，列表有重叠时只下载缺少的股票"""
+        from src.data import yahoo
+        df = self.create_test_data("up")
+        downloaded = []
+
+        def fake_download(tickers, period, interval, prepost=False):
+            downloaded.append(tickers)
+            return {sym: df for sym in tickers}
+
+        with patch.dict(yahoo._batch_hist_cache, clear=True), \
+                patch('src.data.yahoo._download_history', side_effect=fake_download):
+            first = yahoo.fetch_history_batch(["AAPL", "MSFT"])
+            second = yahoo.fetch_history_batch(["MSFT", "NVDA"])
+
+        self.assertEqual(downloaded, [("AAPL", "MSFT"), ("NVDA",)])
+        self.assertEqual(set(first), {"AAPL", "MSFT"})
+        self.assertEqual(set(second), {"MSFT", "NVDA"})
+        # 返回副本，修改不影响缓存
+        second["MSFT"]["Close"] = 0.0
+        self.assertFalse((first["MSFT"]["Close"] == 0.0).any())
+
+        # 单支股票的 Ticker.history 数据与批量下载的数据分开缓存
+        with patch.dict(yahoo._hist_cache, clear=True), \
+                patch('src.data.yahoo.yf.Ticker') as mock_ticker:
+            mock_ticker.return_value.history.return_value = df.head(5)
+            self.assertEqual(len(yahoo.get_historical_data("MSFT", period="90d", interval="1d")), 5)
+            mock_ticker.return_value.history.assert_called_once()
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file